@@ -2,48 +2,216 @@
 """
 Configuration loader for Debugger Station
 """
-import yaml
+from __future__ import annotations
+
+import glob
+import os
+import pickle
+import string
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent / 'config.yml'
+DEFAULT_MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+
+# Parsed configs already loaded by this process: path -> (stat key, data).
+_DATA_CACHE: "OrderedDict[str, Tuple[Tuple[int, int], Dict]]" = OrderedDict()
+_DATA_CACHE_SIZE = 100
+_data_cache_lock = threading.Lock()
+
+
+def config_stat_key(config_path) -> Tuple[int, int]:
+    """(mtime_ns, size) of a config file; changes whenever the file is edited."""
+    st = os.stat(config_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load_config_data(config_path) -> Dict:
+    """
+    Load parsed config.yml, reusing earlier parses while the file is unchanged.
+
+    Parses are cached in memory per path and on disk in a pickle sidecar,
+    both keyed on the YAML file's mtime and size
+    (`config.yml.<mtime_ns>.<size>.pkl`), so editing config.yml invalidates
+    them. Failing to write the sidecar (e.g. read-only checkout) is not an
+    error. The returned data is shared between callers; treat it as
+    read-only.
+    """
+    config_path = str(config_path)
+    stat_key = config_stat_key(config_path)
+
+    with _data_cache_lock:
+        cached = _DATA_CACHE.get(config_path)
+        if cached is not None and cached[0] == stat_key:
+            _DATA_CACHE.move_to_end(config_path)
+            return cached[1]
+
+    data = _load_config_data_uncached(config_path, stat_key)
+
+    with _data_cache_lock:
+        _DATA_CACHE[config_path] = (stat_key, data)
+        _DATA_CACHE.move_to_end(config_path)
+        while len(_DATA_CACHE) > _DATA_CACHE_SIZE:
+            _DATA_CACHE.popitem(last=False)
+    return data
+
+
+def _load_config_data_uncached(config_path: str, stat_key: Tuple[int, int]) -> Dict:
+    """Load config.yml via its pickle sidecar, parsing the YAML on a miss."""
+    sidecar_path = f"{config_path}.{stat_key[0]}.{stat_key[1]}.pkl"
+
+    try:
+        with open(sidecar_path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        pass
+
+    # Imported here so warm starts served from the sidecar never load PyYAML.
+    import yaml
+
+    # libyaml's C loader when PyYAML was built with it; same safe semantics.
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(config_path, 'r') as f:
+        data = yaml.load(f, Loader=loader)
+
+    for stale_path in glob.glob(glob.escape(config_path) + ".*.pkl"):
+        try:
+            os.unlink(stale_path)
+        except OSError:
+            pass
+
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(config_path)),
+            prefix=".config-cache-",
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, sidecar_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+    except Exception:
+        # Cache is best-effort; the parsed YAML is authoritative.
+        pass
+
+    return data
+
+
+def _norm(value) -> Optional[str]:
+    """Normalize a user-supplied token (transport name etc.); blank or non-str -> None."""
+    if not isinstance(value, str):
+        return None
+    return value.strip().lower() or None
 
-class Config:
-    def __init__(self, config_path: str = None):
-        if config_path is None:
-            config_path = Path(__file__).parent / 'config.yml'
 
-        with open(config_path, 'r') as f:
-            self.data = yaml.safe_load(f)
+_FORMATTER = string.Formatter()
 
-    @property
-    def server_port(self) -> int:
-        return self.data['server']['port']
 
-    @property
-    def upload_dir(self) -> str:
-        return self.data['server']['upload_dir']
+def _compile_template(template: str) -> Optional[Tuple[Tuple[str, Optional[str]], ...]]:
+    """
+    Split a str.format template into (literal, field_name) parts once.
 
-    @property
-    def gdb_base_port(self) -> int:
-        return self.data['ports']['gdb_base']
+    Returns None when the template uses anything beyond plain {name} fields
+    (format specs, conversions, attribute/index access) or does not parse;
+    such templates are left to str.format.
+    """
+    parts = []
+    try:
+        for literal, field_name, format_spec, conversion in _FORMATTER.parse(template):
+            if field_name is not None and (
+                not field_name.isidentifier() or format_spec or conversion
+            ):
+                return None
+            parts.append((literal, field_name))
+    except ValueError:
+        return None
+    return tuple(parts)
 
-    @property
-    def telnet_base_port(self) -> int:
-        return self.data['ports']['telnet_base']
 
-    @property
-    def rtt_base_port(self) -> int:
-        return self.data['ports']['rtt_base']
+class Config:
+    def __init__(self, config_path: str = None):
+        if config_path is None:
+            config_path = DEFAULT_CONFIG_PATH
+
+        self.config_path = str(config_path)
+        # Taken before loading: if the file changes mid-load, the next
+        # get_config() sees a newer stat key and reloads.
+        self.version: Tuple[int, int] = config_stat_key(self.config_path)
+        self.data = load_config_data(self.config_path)
+
+        # Plain attributes rather than properties: these are read on every
+        # port calculation and never change for a loaded config.
+        self.server_port: int = self.data['server']['port']
+        self.upload_dir: str = self.data['server']['upload_dir']
+        self.max_upload_bytes: int = self.data['server'].get(
+            'max_upload_bytes', DEFAULT_MAX_UPLOAD_BYTES
+        )
+        self.gdb_base_port: int = self.data['ports']['gdb_base']
+        self.telnet_base_port: int = self.data['ports']['telnet_base']
+        self.rtt_base_port: int = self.data['ports']['rtt_base']
+
+        # Top-level sections bound once so accessors skip the self.data descent.
+        self._probes: List[Dict] = self.data.get('probes') or []
+        self._targets: Dict[str, Dict] = self.data.get('targets') or {}
+        self._containers: Dict[str, Dict] = self.data.get('containers') or {}
+        self._interface_defaults: Dict[str, Dict] = self.data.get('interface_defaults') or {}
+
+        self._probes_by_id: Dict[int, Dict] = {}
+        for probe in self._probes:
+            # First definition wins, matching the previous linear scan.
+            self._probes_by_id.setdefault(probe['id'], probe)
+        self._transport_table = self._build_transport_table()
+        self._allowed_transport_sets = {
+            key: frozenset(cfg["allowed"]) for key, cfg in self._transport_table.items()
+        }
+        # Effective default per (target, interface): explicit default, else
+        # the first allowed transport.
+        self._default_transports: Dict[Tuple[str, str], Optional[str]] = {
+            key: cfg.get("default") or (cfg["allowed"][0] if cfg["allowed"] else None)
+            for key, cfg in self._transport_table.items()
+        }
+        self._build_compatibility_tables()
+        self._targets_view: Optional[Dict[str, Dict]] = None
+        self._container_name_cache: Dict[Tuple[str, Optional[str]], Optional[str]] = {}
+        self._compiled_templates: Dict[str, Optional[Tuple]] = {}
+        for template in self._iter_command_templates():
+            self._compiled_templates[template] = _compile_template(template)
+        # USB-derived probe facts, computed once per configured probe. Kept
+        # beside the probe dicts (not in them) so API output is unchanged.
+        self._probe_product_ids: Dict[int, str] = {}
+        self._probe_wch_modes: Dict[int, Optional[str]] = {}
+        for probe_id, probe in self._probes_by_id.items():
+            product_id = self._normalize_usb_id(probe.get("product_id"))
+            self._probe_product_ids[probe_id] = product_id
+            self._probe_wch_modes[probe_id] = self._infer_wch_link_mode(
+                probe.get("interface"), product_id
+            )
+
+        # These accessors are pure functions of the loaded config, and a single
+        # dispatch calls them repeatedly with the same arguments. Memoize them
+        # per instance; a reloaded config gets a fresh Config and fresh caches.
+        for name in (
+            'get_target',
+            'get_container',
+            'get_command',
+            'is_probe_compatible',
+            'resolve_transport',
+        ):
+            setattr(self, name, lru_cache(maxsize=None)(getattr(self, name)))
 
     def get_probe(self, probe_id: int) -> Optional[Dict]:
         """Get probe configuration by ID"""
-        for probe in self.data['probes']:
-            if probe['id'] == probe_id:
-                return probe
-        return None
+        return self._probes_by_id.get(probe_id)
 
     def get_all_probes(self) -> List[Dict]:
         """Get all probe configurations"""
-        return self.data['probes']
+        return self._probes
 
     def get_probe_device_path(self, probe_id: int) -> Optional[str]:
         """Get device_path for USB-serial probes"""
@@ -61,19 +229,19 @@ class Config:
 
     def get_target(self, target_name: str) -> Optional[Dict]:
         """Get target configuration by name"""
-        return self.data['targets'].get(target_name)
+        return self._targets.get(target_name)
 
     def get_all_targets(self) -> Dict[str, Dict]:
         """Get all target configurations"""
-        return self.data['targets']
+        return self._targets
 
     def get_container(self, container_key: str) -> Optional[Dict]:
         """Get container configuration by key"""
-        return self.data['containers'].get(container_key)
+        return self._containers.get(container_key)
 
     def get_all_containers(self) -> Dict[str, Dict]:
         """Get all container configurations"""
-        return self.data['containers']
+        return self._containers
 
     def _normalize_interface_list(self, value) -> List[str]:
         """Normalize an interface list from config into a deduplicated list."""
@@ -92,9 +260,9 @@ class Config:
             normalized.append(interface)
         return normalized
 
-    def get_compatible_probes_by_mode(self, target_name: str) -> Dict[str, List[str]]:
+    def _parse_compatible_probes(self, compatible_cfg) -> Dict[str, List[str]]:
         """
-        Get compatible probe interfaces grouped by mode.
+        Parse a target's compatible_probes into interfaces grouped by mode.
 
         Supports both:
         - legacy list format: compatible_probes: [jlink, cmsis-dap]
@@ -104,11 +272,6 @@ class Config:
               flash: [...]
               print: [...]
         """
-        target = self.get_target(target_name)
-        if not target:
-            return {}
-
-        compatible_cfg = target.get("compatible_probes", [])
         if isinstance(compatible_cfg, dict):
             by_mode: Dict[str, List[str]] = {}
             for raw_mode, raw_interfaces in compatible_cfg.items():
@@ -125,21 +288,66 @@ class Config:
             "print": interfaces.copy(),
         }
 
+    def _build_compatibility_tables(self) -> None:
+        """Precompute per-target compatible interfaces (ordered lists and lookup sets)."""
+        self._compatible_by_mode: Dict[str, Dict[str, List[str]]] = {}
+        self._compatible_union: Dict[str, List[str]] = {}
+        self._compatible_sets: Dict[Tuple[str, Optional[str]], FrozenSet[str]] = {}
+
+        for target_name, target in self._targets.items():
+            if not isinstance(target, dict):
+                continue
+            by_mode = self._parse_compatible_probes(target.get("compatible_probes", []))
+            union: List[str] = []
+            for mode, interfaces in by_mode.items():
+                self._compatible_sets[(target_name, mode)] = frozenset(interfaces)
+                for interface in interfaces:
+                    if interface not in union:
+                        union.append(interface)
+            self._compatible_by_mode[target_name] = by_mode
+            self._compatible_union[target_name] = union
+            self._compatible_sets[(target_name, None)] = frozenset(union)
+
+    def get_compatible_probes_by_mode(self, target_name: str) -> Dict[str, List[str]]:
+        """Get compatible probe interfaces grouped by mode."""
+        return self._compatible_by_mode.get(target_name, {})
+
     def get_compatible_probes(self, target_name: str, mode: Optional[str] = None) -> List[str]:
         """Get compatible probe interfaces for a target and optionally mode."""
-        by_mode = self.get_compatible_probes_by_mode(target_name)
-        if not by_mode:
-            return []
+        mode = _norm(mode)
+        if mode:
+            return self.get_compatible_probes_by_mode(target_name).get(mode, [])
+        return self._compatible_union.get(target_name, [])
 
-        if isinstance(mode, str) and mode.strip():
-            return by_mode.get(mode.strip().lower(), [])
+    def get_targets_view(self) -> Dict[str, Dict]:
+        """
+        Per-target summary served by the API's /targets endpoint.
 
-        compatible_interfaces: List[str] = []
-        for interfaces in by_mode.values():
-            for interface in interfaces:
-                if interface not in compatible_interfaces:
-                    compatible_interfaces.append(interface)
-        return compatible_interfaces
+        Built on first use and kept for the life of this config; callers
+        must not modify it.
+        """
+        if self._targets_view is None:
+            targets = {}
+            for name, target_config in self._targets.items():
+                if not isinstance(target_config, dict):
+                    continue
+                compatible_probes = self.get_compatible_probes(name)
+                targets[name] = {
+                    "description": target_config.get("description", ""),
+                    "compatible_probes": compatible_probes,
+                    "compatible_interfaces": compatible_probes,
+                    "compatible_probes_by_mode": self.get_compatible_probes_by_mode(name),
+                    "container": target_config.get("container", ""),
+                    "transports": {
+                        interface: {
+                            "default": self.get_default_transport(name, interface),
+                            "allowed": self.get_allowed_transports(name, interface),
+                        }
+                        for interface in compatible_probes
+                    },
+                }
+            self._targets_view = targets
+        return self._targets_view
 
     def get_command(self, target_name: str, interface: str, mode: str) -> Optional[str]:
         """
@@ -163,8 +371,7 @@ class Config:
         if command:
             return command
 
-        interface_defaults = self.data.get("interface_defaults", {})
-        default_interface_cfg = interface_defaults.get(interface, {})
+        default_interface_cfg = self._interface_defaults.get(interface, {})
         if not isinstance(default_interface_cfg, dict):
             return None
         default_commands = default_interface_cfg.get("commands", {})
@@ -172,22 +379,13 @@ class Config:
             return None
         return default_commands.get(mode)
 
-    def get_transport_config(self, target_name: str, interface: str) -> Dict:
-        """Get transport policy for target/interface pair."""
-        target = self.get_target(target_name)
-        if not target:
-            return {}
-
-        transports = target.get('transports', {})
-        if not isinstance(transports, dict):
-            return {}
-
-        cfg = transports.get(interface, {})
+    def _normalize_transport_config(self, cfg) -> Dict:
+        """Normalize one targets.<target>.transports.<interface> entry."""
         if isinstance(cfg, str):
             normalized = cfg.strip().lower()
             if not normalized:
                 return {}
-            return {"default": normalized, "allowed": [normalized]}
+            return {"default": normalized, "allowed": (normalized,)}
 
         if not isinstance(cfg, dict):
             return {}
@@ -212,25 +410,36 @@ class Config:
 
         return {
             "default": default_transport,
-            "allowed": allowed,
+            "allowed": tuple(allowed),
         }
 
-    def get_allowed_transports(self, target_name: str, interface: str) -> List[str]:
+    def _build_transport_table(self) -> Dict[Tuple[str, str], Dict]:
+        """Normalize every target transport policy once, keyed by (target, interface)."""
+        table: Dict[Tuple[str, str], Dict] = {}
+        for target_name, target in self._targets.items():
+            if not isinstance(target, dict):
+                continue
+            transports = target.get('transports', {})
+            if not isinstance(transports, dict):
+                continue
+            for interface, cfg in transports.items():
+                normalized = self._normalize_transport_config(cfg)
+                if normalized:
+                    table[(target_name, interface)] = normalized
+        return table
+
+    def get_transport_config(self, target_name: str, interface: str) -> Dict:
+        """Get transport policy for target/interface pair."""
+        return self._transport_table.get((target_name, interface), {})
+
+    def get_allowed_transports(self, target_name: str, interface: str) -> Tuple[str, ...]:
         """Get allowed transports for target/interface pair."""
         cfg = self.get_transport_config(target_name, interface)
-        return cfg.get("allowed", [])
+        return cfg.get("allowed", ())
 
     def get_default_transport(self, target_name: str, interface: str) -> Optional[str]:
         """Get default transport for target/interface pair."""
-        cfg = self.get_transport_config(target_name, interface)
-        default_transport = cfg.get("default")
-        if default_transport:
-            return default_transport
-
-        allowed = cfg.get("allowed", [])
-        if allowed:
-            return allowed[0]
-        return None
+        return self._default_transports.get((target_name, interface))
 
     def _normalize_usb_id(self, value) -> str:
         """Normalize USB ID strings such as '0x8010' or '8010'."""
@@ -241,6 +450,21 @@ class Config:
             normalized = normalized[2:]
         return normalized
 
+    def _is_configured_probe(self, probe) -> bool:
+        if not isinstance(probe, dict):
+            return False
+        probe_id = probe.get("id")
+        return isinstance(probe_id, int) and self._probes_by_id.get(probe_id) is probe
+
+    def _infer_wch_link_mode(self, interface, product_id: str) -> Optional[str]:
+        if interface != "wch-link":
+            return None
+        if product_id == "8010":
+            return "riscv"
+        if product_id == "8012":
+            return "arm"
+        return None
+
     def get_wch_link_mode(self, probe: Optional[Dict]) -> Optional[str]:
         """
         Infer WCH-Link mode from USB product ID.
@@ -250,15 +474,11 @@ class Config:
         """
         if not isinstance(probe, dict):
             return None
-        if probe.get("interface") != "wch-link":
-            return None
-
-        product_id = self._normalize_usb_id(probe.get("product_id"))
-        if product_id == "8010":
-            return "riscv"
-        if product_id == "8012":
-            return "arm"
-        return None
+        if self._is_configured_probe(probe):
+            return self._probe_wch_modes[probe["id"]]
+        return self._infer_wch_link_mode(
+            probe.get("interface"), self._normalize_usb_id(probe.get("product_id"))
+        )
 
     def validate_probe_transport(
         self,
@@ -282,16 +502,16 @@ class Config:
             return
 
         wch_mode = self.get_wch_link_mode(probe)
-        requested = None
-        if isinstance(requested_transport, str):
-            requested = requested_transport.strip().lower() or None
-
-        resolved = None
-        if isinstance(resolved_transport, str):
-            resolved = resolved_transport.strip().lower() or None
+        requested = _norm(requested_transport)
+        resolved = _norm(resolved_transport)
 
         probe_id = probe.get("id") if isinstance(probe, dict) else "unknown"
-        product_id = self._normalize_usb_id(probe.get("product_id") if isinstance(probe, dict) else "")
+        if not isinstance(probe, dict):
+            product_id = ""
+        elif self._is_configured_probe(probe):
+            product_id = self._probe_product_ids[probe["id"]]
+        else:
+            product_id = self._normalize_usb_id(probe.get("product_id"))
 
         if wch_mode == "riscv":
             if requested and requested != "sdi":
@@ -335,11 +555,10 @@ class Config:
         if mode == "print":
             return None
 
-        requested = None
-        if isinstance(requested_transport, str):
-            requested = requested_transport.strip().lower() or None
+        requested = _norm(requested_transport)
 
         allowed = self.get_allowed_transports(target_name, interface)
+        allowed_set = self._allowed_transport_sets.get((target_name, interface), frozenset())
         default_transport = self.get_default_transport(target_name, interface)
 
         if requested:
@@ -348,8 +567,8 @@ class Config:
                     f"Transport '{requested}' was requested for target={target_name}, "
                     f"interface={interface}, but no transport policy is configured."
                 )
-            if requested not in allowed:
-                if interface == "wch-link" and allowed == ["sdi"]:
+            if requested not in allowed_set:
+                if interface == "wch-link" and allowed == ("sdi",):
                     raise ValueError(
                         f"Transport '{requested}' is invalid for target={target_name}, "
                         f"interface={interface}: this WCH RISC-V target is fixed to 'sdi'. "
@@ -359,7 +578,7 @@ class Config:
                     )
                 raise ValueError(
                     f"Transport '{requested}' is not allowed for target={target_name}, "
-                    f"interface={interface}. Allowed: {allowed}"
+                    f"interface={interface}. Allowed: {list(allowed)}"
                 )
             return requested
 
@@ -367,6 +586,23 @@ class Config:
             return default_transport
         return None
 
+    def _iter_command_templates(self):
+        """Yield every command template string defined in targets and interface_defaults."""
+        command_maps = []
+        for target in self._targets.values():
+            if isinstance(target, dict) and isinstance(target.get('commands'), dict):
+                command_maps.extend(target['commands'].values())
+        for interface_cfg in self._interface_defaults.values():
+            if isinstance(interface_cfg, dict) and isinstance(interface_cfg.get('commands'), dict):
+                command_maps.append(interface_cfg['commands'])
+
+        for commands in command_maps:
+            if not isinstance(commands, dict):
+                continue
+            for template in commands.values():
+                if isinstance(template, str):
+                    yield template
+
     def format_command(self, command_template: str, **kwargs) -> str:
         """
         Format command template with provided arguments
@@ -378,7 +614,29 @@ class Config:
         Returns:
             Formatted command string
         """
-        return command_template.format(**kwargs)
+        return self.format_command_map(command_template, kwargs)
+
+    def format_command_map(self, command_template: str, values) -> str:
+        """
+        Format command template from a mapping, like str.format_map.
+
+        Only placeholders present in the template are looked up, so a mapping
+        with __missing__ can produce values on demand. Configured templates
+        are pre-split into literal/field parts at load time, so formatting is
+        a single join instead of a re-parse.
+        """
+        if command_template in self._compiled_templates:
+            parts = self._compiled_templates[command_template]
+        else:
+            parts = _compile_template(command_template)
+            self._compiled_templates[command_template] = parts
+
+        if parts is None:
+            return command_template.format_map(values)
+        return "".join(
+            literal if field is None else literal + str(values[field])
+            for literal, field in parts
+        )
 
     def is_probe_compatible(self, target_name: str, probe_id: int, mode: Optional[str] = None) -> bool:
         """Check if a probe is compatible with a target"""
@@ -390,12 +648,17 @@ class Config:
         if not probe:
             return False
 
-        probe_interface = probe.get('interface')
-        compatible_probes = self.get_compatible_probes(target_name, mode=mode)
-        return probe_interface in compatible_probes
+        compatible = self._compatible_sets.get((target_name, _norm(mode)), frozenset())
+        return probe.get('interface') in compatible
 
     def get_container_for_target(self, target_name: str, interface: str = None) -> Optional[str]:
         """Get the container name for a target (optionally resolved per interface)."""
+        key = (target_name, interface)
+        if key not in self._container_name_cache:
+            self._container_name_cache[key] = self._resolve_container_name(target_name, interface)
+        return self._container_name_cache[key]
+
+    def _resolve_container_name(self, target_name: str, interface: Optional[str]) -> Optional[str]:
         target = self.get_target(target_name)
         if not target:
             return None
@@ -413,11 +676,33 @@ class Config:
         return container['name']
 
 # Singleton instance
-_config_instance = None
+_config_instance: Optional[Config] = None
+_config_lock = threading.Lock()
+
+def _is_current(instance: Optional[Config], config_path: str) -> bool:
+    if instance is None or instance.config_path != config_path:
+        return False
+    try:
+        return config_stat_key(config_path) == instance.version
+    except OSError:
+        # Keep serving the last good config if the file is briefly missing.
+        return True
+
 
 def get_config(config_path: str = None) -> Config:
-    """Get or create Config singleton instance"""
+    """
+    Get the Config singleton, reloading it when config.yml has changed.
+
+    Each call costs one stat(); the YAML is only re-read after an edit.
+    Safe to call from worker threads.
+    """
     global _config_instance
-    if _config_instance is None:
-        _config_instance = Config(config_path)
-    return _config_instance
+    config_path = str(config_path if config_path is not None else DEFAULT_CONFIG_PATH)
+    instance = _config_instance
+    if instance is not None and _is_current(instance, config_path):
+        return instance
+    with _config_lock:
+        instance = _config_instance
+        if instance is None or not _is_current(instance, config_path):
+            instance = _config_instance = Config(config_path)
+        return instance
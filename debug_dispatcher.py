@@ -3,154 +3,374 @@
 Debug Dispatcher
 Executes debug or flash commands based on configuration
 """
+from __future__ import annotations
+
 import sys
+import re
+import select
+import shlex
 import subprocess
 import fcntl
 import os
 import time
-import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict
 from config_loader import get_config
+import docker_api
+import tcp_diag
 
 PROCESS_STARTUP_GRACE_SECONDS = 10
 FIRST_ATTACH_GRACE_SECONDS = 60
 POLL_INTERVAL_SECONDS = 1
+# Safety-net poll while a GDB client is attached; disconnects wake the
+# monitor immediately through sock_diag destroy notifications.
+ATTACHED_POLL_INTERVAL_SECONDS = 5
 MAX_PROCESS_MISS_COUNT = 3
+# How long cleanup waits for signalled servers to exit (releasing ports and
+# the USB device) before it sends SIGKILL.
+CLEANUP_EXIT_WAIT_SECONDS = 2
 UART_BAUD_MIN = 300
 UART_BAUD_MAX = 3_000_000
 UART_BAUD_DEFAULT = 115200
 
+_COMPOSE_PATH = Path(__file__).resolve().parent / "docker-compose.probes.yml"
+
+
+class LazyTemplateArgs(dict):
+    """Command template arguments computed on first reference."""
+
+    def __init__(self, producers):
+        super().__init__()
+        self._producers = producers
+
+    def __missing__(self, key):
+        # Unknown placeholders raise KeyError, as with str.format.
+        value = self._producers[key]()
+        self[key] = value
+        return value
+
+def docker_exec(container_name, argv, detach=False, timeout=None):
+    """
+    Run argv inside a container via the Docker Engine API.
+
+    Falls back to the docker CLI when the API socket is not usable.
+    """
+    try:
+        return docker_api.exec_run(container_name, argv, detach=detach, timeout=timeout)
+    except docker_api.DockerUnavailable:
+        pass
+
+    cmd = ["docker", "exec"]
+    if detach:
+        cmd.append("-d")
+    cmd.append(container_name)
+    cmd.extend(argv)
+    if detach:
+        # Detached execs produce no output worth reading; skip the pipes.
+        return subprocess.run(
+            cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout
+        )
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+def _forward(stream):
+    """Return a bytes sink that writes straight through to a std stream."""
+    def write(chunk):
+        stream.buffer.write(chunk)
+        stream.buffer.flush()
+    return write
+
+def docker_exec_stream(container_name, argv, timeout=None):
+    """
+    Run argv inside a container, forwarding its output to our stdout/stderr live.
+
+    Returns a CompletedProcess whose stdout/stderr are empty; output was streamed.
+    """
+    out = _forward(sys.stdout)
+    err = _forward(sys.stderr)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        return docker_api.exec_stream(container_name, argv, out, err, timeout=timeout)
+    except docker_api.DockerUnavailable:
+        pass
+
+    cmd = ["docker", "exec", container_name, *argv]
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    sinks = {proc.stdout.fileno(): out, proc.stderr.fileno(): err}
+    try:
+        while sinks:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+            readable, _, _ = select.select(list(sinks), [], [], remaining)
+            for fd in readable:
+                chunk = os.read(fd, 65536)
+                if chunk:
+                    sinks[fd](chunk)
+                else:
+                    del sinks[fd]
+        returncode = proc.wait()
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    return subprocess.CompletedProcess(args=cmd, returncode=returncode, stdout="", stderr="")
 
 def acquire_lock(probe_id):
     """Acquire exclusive lock for probe"""
     lock_path = f"/var/lock/probe_{probe_id}.lock"
-    Path("/var/lock").mkdir(parents=True, exist_ok=True)
+    if not os.path.isdir("/var/lock"):
+        Path("/var/lock").mkdir(parents=True, exist_ok=True)
 
-    lock_file = open(lock_path, 'w')
+    # A raw fd is all flock needs; no buffered file object, no truncation.
+    lock_fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT, 0o644)
     try:
-        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        return lock_file
+        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_fd
     except BlockingIOError:
+        os.close(lock_fd)
         print(f"Error: Probe #{probe_id} is busy", file=sys.stderr)
         sys.exit(1)
 
+@lru_cache(maxsize=None)
 def get_gdb_port(probe_id):
     """Calculate GDB port for probe"""
     config = get_config()
     return config.gdb_base_port + probe_id
 
+@lru_cache(maxsize=None)
 def get_telnet_port(probe_id):
     """Calculate Telnet port for probe"""
     config = get_config()
     return config.telnet_base_port + probe_id
 
+@lru_cache(maxsize=None)
 def get_rtt_port(probe_id):
     """Calculate RTT/print port for probe"""
     config = get_config()
     return config.rtt_base_port + probe_id
 
+@lru_cache(maxsize=None)
 def probe_session_patterns(probe_id, mode):
     """Get process patterns that indicate an active probe session."""
     gdb_port = get_gdb_port(probe_id)
     rtt_port = get_rtt_port(probe_id)
 
     if mode == "debug":
-        return [
+        return (
             f"gdb_port {gdb_port}",
             f"-port {gdb_port}",
             f":{gdb_port}",
-        ]
+        )
     if mode == "print":
-        return [
+        return (
             f"RTTTelnetPort {rtt_port}",
             f"TCP-LISTEN:{rtt_port}",
             f":{rtt_port}",
-        ]
-    return []
+        )
+    return ()
 
-def has_active_session(container_name, probe_id, mode):
-    """Check whether probe session process is still active in container."""
+def _ere_port_alternation(patterns):
+    """
+    Combine literal patterns that each end in a port number into one ERE.
+
+    The trailing boundary keeps port 3331 from also matching 33310.
+    """
+    return "(%s)([^0-9]|$)" % "|".join(_ere_literal(pattern) for pattern in patterns)
+
+@lru_cache(maxsize=None)
+def session_pattern_regex(probe_id, mode):
+    """Single pgrep ERE matching any active-session pattern (None if there are none)."""
     patterns = probe_session_patterns(probe_id, mode)
-    for pattern in patterns:
-        result = subprocess.run(
-            ["docker", "exec", container_name, "pgrep", "-f", "--", pattern],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-        if result.returncode == 0:
-            return True
-    return False
+    if not patterns:
+        return None
+    return _ere_port_alternation(patterns)
+
+class ContainerShell:
+    """
+    Long-lived `docker exec -i <container> /bin/sh` for repeated checks.
+
+    Commands are written to the shell's stdin and their exit status read
+    back, so polling pays the exec attach cost once instead of per tick.
+    """
+
+    def __init__(self, container_name):
+        self.container_name = container_name
+        self.proc = None
+        self._buffer = b""
+        try:
+            self.proc = subprocess.Popen(
+                ["docker", "exec", "-i", container_name, "/bin/sh"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError:
+            self.proc = None
+
+    def run_status(self, command, timeout=5):
+        """
+        Run a shell command and return its exit status.
+
+        Returns None (and closes the session) if the shell is unusable, so
+        callers can fall back to a one-off exec.
+        """
+        if self.proc is None:
+            return None
+        try:
+            self.proc.stdin.write(f"{command} >/dev/null 2>&1; echo \"__rc=$?\"\n".encode())
+            self.proc.stdin.flush()
+            line = self._readline(time.monotonic() + timeout)
+        except (OSError, ValueError):
+            line = None
+        if line is None or not line.startswith(b"__rc="):
+            self.close()
+            return None
+        return int(line[len(b"__rc="):])
+
+    def _readline(self, deadline):
+        fd = self.proc.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                return None
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                return None
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line
+
+    def close(self):
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+def has_active_session(container_name, probe_id, mode, pattern=None, shell=None):
+    """Check whether probe session process is still active in container."""
+    if pattern is None:
+        pattern = session_pattern_regex(probe_id, mode)
+    if not pattern:
+        return False
+    if shell is not None:
+        status = shell.run_status(f"pgrep -f -- {shlex.quote(pattern)}")
+        if status is not None:
+            return status == 0
+    result = docker_exec(container_name, ["pgrep", "-f", "--", pattern])
+    return result.returncode == 0
+
+_MONITOR_LOG_FDS: Dict[int, int] = {}
+
 
 def monitor_log(probe_id, message):
     """Append lock-monitor lifecycle logs per probe."""
-    ts = time.strftime("%Y-%m-%d %H:%M:%S")
+    ts = datetime.now().isoformat(sep=" ", timespec="seconds")
     line = f"[{ts}] {message}\n"
-    log_path = Path(f"/tmp/lock_monitor_probe_{probe_id}.log")
     try:
-        with log_path.open("a", encoding="utf-8") as f:
-            f.write(line)
+        fd = _MONITOR_LOG_FDS.get(probe_id)
+        if fd is None:
+            # Opened once and kept for the monitor's lifetime.
+            fd = os.open(
+                f"/tmp/lock_monitor_probe_{probe_id}.log",
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                0o644,
+            )
+            _MONITOR_LOG_FDS[probe_id] = fd
+        os.write(fd, line.encode("utf-8"))
     except Exception:
         # Keep monitor robust even if logging fails.
         pass
 
+def close_monitor_log(probe_id):
+    """Close the persistent log file descriptor for a probe, if open."""
+    fd = _MONITOR_LOG_FDS.pop(probe_id, None)
+    if fd is not None:
+        os.close(fd)
+
 
 def count_gdb_clients(gdb_port):
     """
-    Count established TCP clients to local GDB server port using `ss`.
+    Count established TCP clients to local GDB server port.
+
+    Reads the socket table via netlink sock_diag, falling back to
+    /proc/net/tcp{,6}.
 
     Returns:
         int: number of ESTABLISHED sessions
-        None: when `ss` is unavailable or check failed
+        None: when neither source is available
     """
-    if not shutil.which("ss"):
-        return None
+    try:
+        return tcp_diag.count_established(gdb_port)
+    except OSError:
+        pass
 
     try:
-        result = subprocess.run(
-            ["ss", "-H", "-tan", "state", "established", f"sport = :{gdb_port}"],
-            capture_output=True,
-            text=True,
-            timeout=2,
-        )
-    except Exception:
+        return tcp_diag.count_established_procfs(gdb_port)
+    except OSError:
         return None
 
-    if result.returncode != 0 and not result.stdout.strip():
-        return 0
-
-    return len([line for line in result.stdout.splitlines() if line.strip()])
-
 
 def run_lock_monitor(lock_fd, container_name, probe_id, mode, interface):
     """Keep lock held while session is active; debug mode is client-connection based."""
-    lock_file = os.fdopen(lock_fd, 'w')
     seen_process = False
     miss_count = 0
-    started_at = time.time()
+    started_at = time.monotonic()
     gdb_port = get_gdb_port(probe_id)
+    session_pattern = session_pattern_regex(probe_id, mode)
     saw_client = False
-    ss_available = bool(shutil.which("ss"))
+    client_state_available = True
+    destroy_watcher = tcp_diag.TcpDestroyWatcher(gdb_port) if mode == "debug" else None
+    # The in-container pgrep runs on a worker thread so the client count is
+    # read while the docker exec round-trip is in flight.
+    pool = ThreadPoolExecutor(max_workers=1)
+    shell = ContainerShell(container_name)
 
     if mode == "debug":
         monitor_log(
             probe_id,
             f"startup: waiting for first GDB attach up to {FIRST_ATTACH_GRACE_SECONDS}s (container={container_name}, port={gdb_port})",
         )
-        if not ss_available:
-            monitor_log(
-                probe_id,
-                "warning: `ss` not found; falling back to process-liveness mode (auto-disconnect cleanup disabled)",
-            )
 
     try:
         while True:
-            active = has_active_session(container_name, probe_id, mode)
+            # Pace ticks from their start so slow execs do not stretch the interval.
+            next_tick = time.monotonic() + POLL_INTERVAL_SECONDS
+            active_future = pool.submit(
+                has_active_session, container_name, probe_id, mode, session_pattern, shell
+            )
+            client_count = None
+            if mode == "debug" and client_state_available:
+                client_count = count_gdb_clients(gdb_port)
+            active = active_future.result()
+
             if active:
                 seen_process = True
                 miss_count = 0
             else:
-                if (not seen_process) and (time.time() - started_at < PROCESS_STARTUP_GRACE_SECONDS):
-                    time.sleep(POLL_INTERVAL_SECONDS)
+                if (not seen_process) and (time.monotonic() - started_at < PROCESS_STARTUP_GRACE_SECONDS):
+                    time.sleep(max(0.0, next_tick - time.monotonic()))
                     continue
 
                 miss_count += 1
@@ -158,20 +378,19 @@ def run_lock_monitor(lock_fd, container_name, probe_id, mode, interface):
                     monitor_log(probe_id, f"session process missing repeatedly; ending monitor (mode={mode})")
                     break
 
-            if mode == "debug" and ss_available:
-                client_count = count_gdb_clients(gdb_port)
+            if mode == "debug" and client_state_available:
                 if client_count is None:
-                    ss_available = False
+                    client_state_available = False
                     monitor_log(
                         probe_id,
-                        "warning: failed to read GDB client state via `ss`; falling back to process-liveness mode",
+                        "warning: failed to read GDB client state; falling back to process-liveness mode",
                     )
                 elif client_count > 0:
                     if not saw_client:
                         saw_client = True
                         monitor_log(probe_id, f"first GDB attach detected (clients={client_count})")
                 else:
-                    elapsed = time.time() - started_at
+                    elapsed = time.monotonic() - started_at
                     if saw_client:
                         monitor_log(probe_id, "GDB disconnect detected; stopping debug session")
                         cleanup_existing_processes(container_name, probe_id, interface)
@@ -184,86 +403,114 @@ def run_lock_monitor(lock_fd, container_name, probe_id, mode, interface):
                         cleanup_existing_processes(container_name, probe_id, interface)
                         break
 
-            time.sleep(POLL_INTERVAL_SECONDS)
+            if saw_client and destroy_watcher.available:
+                destroy_watcher.wait(ATTACHED_POLL_INTERVAL_SECONDS)
+            else:
+                time.sleep(max(0.0, next_tick - time.monotonic()))
     finally:
+        pool.shutdown(wait=True)
+        shell.close()
+        if destroy_watcher is not None:
+            destroy_watcher.close()
         monitor_log(probe_id, "unlock complete; lock monitor exiting")
-        lock_file.close()
-
-def start_lock_monitor(lock_file, container_name, probe_id, mode, interface):
-    """Spawn background monitor process that inherits the lock FD."""
-    lock_fd = lock_file.fileno()
-    script_path = Path(__file__).resolve()
-    subprocess.Popen(
-        [
-            sys.executable,
-            str(script_path),
-            "--lock-monitor",
-            str(lock_fd),
-            container_name,
-            str(probe_id),
-            mode,
-            interface,
-        ],
-        pass_fds=[lock_fd],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        start_new_session=True,
-    )
+        close_monitor_log(probe_id)
+        os.close(lock_fd)
 
-def cleanup_existing_processes(container_name, probe_id, interface):
-    """Kill existing debug server processes"""
-    gdb_port = get_gdb_port(probe_id)
-    rtt_port = get_rtt_port(probe_id)
+def start_lock_monitor(lock_fd, container_name, probe_id, mode, interface):
+    """Fork a background monitor process that inherits the lock FD."""
+    if os.fork() != 0:
+        return
 
-    # Kill processes listening on GDB port
-    subprocess.run(
-        ["docker", "exec", container_name, "pkill", "-f", f"gdb_port {gdb_port}"],
-        stderr=subprocess.DEVNULL
-    )
+    # Child: detach from the caller's session and pipes so the dispatcher's
+    # caller sees EOF as soon as the parent exits.
+    exit_code = 0
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        os.close(devnull)
+        run_lock_monitor(lock_fd, container_name, probe_id, mode, interface)
+    except BaseException:
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
 
-    # Kill processes listening on RTT/print port
-    subprocess.run(
-        ["docker", "exec", container_name, "pkill", "-f", f"RTTTelnetPort {rtt_port}"],
-        stderr=subprocess.DEVNULL
-    )
-    subprocess.run(
-        ["docker", "exec", container_name, "pkill", "-f", f"TCP-LISTEN:{rtt_port}"],
-        stderr=subprocess.DEVNULL
-    )
-    subprocess.run(
-        ["docker", "exec", container_name, "pkill", "-f", f"Starting print server (probe {probe_id})"],
-        stderr=subprocess.DEVNULL
-    )
-    subprocess.run(
-        ["docker", "exec", container_name, "pkill", "openocd"],
-        stderr=subprocess.DEVNULL
-    )
+def _ere_literal(text):
+    """
+    Escape text as a POSIX ERE matching it literally.
+
+    The first character is wrapped in a bracket expression so the pattern
+    does not match the command line of the process that evaluates it,
+    which contains the pattern text itself.
+    """
+    escaped = re.sub(r"([.\[\]()*+?{}|^$\\/])", r"\\\1", text[1:])
+    return f"[{text[0]}]{escaped}"
+
+def cleanup_script(probe_id, interface, gdb_port=None, rtt_port=None):
+    """Build the shell snippet that kills existing debug server processes."""
+    if gdb_port is None:
+        gdb_port = get_gdb_port(probe_id)
+    if rtt_port is None:
+        rtt_port = get_rtt_port(probe_id)
+
+    # Matched against the full command line (like `pkill -f`).
+    port_patterns = [
+        # Processes listening on GDB port
+        f"gdb_port {gdb_port}",
+        # Processes listening on RTT/print port
+        f"RTTTelnetPort {rtt_port}",
+        f"TCP-LISTEN:{rtt_port}",
+    ]
+    cmdline_patterns = [
+        f"Starting print server (probe {probe_id})",
+    ]
+    # Matched against the process name (like plain `pkill`).
+    name_patterns = ["openocd"]
 
-    # Kill interface-specific processes
+    # Interface-specific processes
     if interface == "jlink":
-        subprocess.run(
-            ["docker", "exec", container_name, "pkill", "JLinkGDBServer"],
-            stderr=subprocess.DEVNULL
-        )
-        subprocess.run(
-            ["docker", "exec", container_name, "pkill", "JLinkRTTClient"],
-            stderr=subprocess.DEVNULL
-        )
+        name_patterns += ["JLinkGDBServer", "JLinkRTTClient"]
     elif interface == "wch-link":
-        # Kill OpenOCD and wlink processes
-        subprocess.run(
-            ["docker", "exec", container_name, "pkill", "wlink"],
-            stderr=subprocess.DEVNULL
-        )
-        subprocess.run(
-            ["docker", "exec", container_name, "pkill", "socat"],
-            stderr=subprocess.DEVNULL
-        )
+        name_patterns += ["wlink", "socat"]
     elif interface == "usb-uart":
-        subprocess.run(
-            ["docker", "exec", container_name, "pkill", "socat"],
-            stderr=subprocess.DEVNULL
+        name_patterns += ["socat"]
+
+    # Scan the process table once, select every matching PID and signal them
+    # with a single kill. The shell and its direct children are excluded, so
+    # a script that embeds this snippet (and so contains the patterns'
+    # text) never kills itself or its pipeline.
+    awk_program = (
+        "$1 != self && $2 != self && ($3 ~ /%s/ || $0 ~ /%s/) { print $1 }"
+        % (
+            "|".join(_ere_literal(name) for name in name_patterns),
+            "|".join(
+                [_ere_port_alternation(port_patterns)]
+                + [_ere_literal(pattern) for pattern in cmdline_patterns]
+            ),
         )
+    )
+    # The signalled servers get a bounded wait to exit (zombies count as
+    # gone), so a launch that follows does not race them for the GDB/RTT
+    # port or the probe. The reader group's own children (kill, ps, sleep)
+    # never match the patterns.
+    wait_ticks = CLEANUP_EXIT_WAIT_SECONDS * 10
+    return (
+        "ps -eo pid=,ppid=,comm=,args= "
+        f"| awk -v self=$$ {shlex.quote(awk_program)} "
+        "| { pids=; while read -r pid; do pids=\"$pids $pid\"; done; "
+        "[ -n \"$pids\" ] || exit 0; "
+        "kill -TERM $pids 2>/dev/null; "
+        "n=0; while [ $n -lt %d ]; do alive=; "
+        "for pid in $pids; do case $(ps -o stat= -p $pid 2>/dev/null) in ''|Z*) ;; *) alive=1 ;; esac; done; "
+        "[ -n \"$alive\" ] || exit 0; sleep 0.1; n=$((n + 1)); done; "
+        "kill -KILL $pids 2>/dev/null; }" % wait_ticks
+    )
+
+def cleanup_existing_processes(container_name, probe_id, interface, gdb_port=None, rtt_port=None):
+    """Kill existing debug server processes"""
+    script = cleanup_script(probe_id, interface, gdb_port=gdb_port, rtt_port=rtt_port)
+    docker_exec(container_name, ["/bin/sh", "-c", script])
 
 def run_compose(compose_args, **kwargs):
     """Run docker compose command with docker-compose/docker compose fallback."""
@@ -278,12 +525,31 @@ def run_compose(compose_args, **kwargs):
             continue
     raise FileNotFoundError("docker-compose (or docker compose plugin) is not installed")
 
+def is_container_running(container_name):
+    """Check container state via the Engine API, falling back to `docker inspect`."""
+    try:
+        return docker_api.container_running(container_name)
+    except docker_api.DockerUnavailable:
+        pass
+
+    try:
+        result = subprocess.run(
+            ["docker", "inspect", "-f", "{{.State.Running}}", container_name],
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        return False
+    return result.returncode == 0 and result.stdout.strip() == "true"
+
 def ensure_container_running(container_name):
     """Start target container on demand if it is not running yet."""
-    compose_path = Path(__file__).resolve().parent / "docker-compose.probes.yml"
-    if not compose_path.exists():
+    if is_container_running(container_name):
+        return True
+
+    if not _COMPOSE_PATH.exists():
         print(
-            f"Error: Compose file not found: {compose_path}. "
+            f"Error: Compose file not found: {_COMPOSE_PATH}. "
             "Run generate_docker_compose_probes.py first.",
             file=sys.stderr,
         )
@@ -291,7 +557,7 @@ def ensure_container_running(container_name):
 
     try:
         result = run_compose(
-            ["-f", str(compose_path), "up", "-d", container_name],
+            ["-f", str(_COMPOSE_PATH), "up", "-d", container_name],
             capture_output=True,
             text=True,
         )
@@ -308,11 +574,11 @@ def ensure_container_running(container_name):
         return False
     return True
 
-def execute_command(container_name, command, mode, probe_id=None):
-    """Execute command in Docker container"""
+def execute_command(container_name, command, mode, probe_id=None, prelude=None):
+    """Execute command in Docker container, optionally preceded by a prelude script"""
     if mode == "print":
         # Print mode with auto-restart on disconnect
-        restart_cmd = f"""
+        script = f"""
 while true; do
     echo "[$(date)] Starting print server (probe {probe_id})..." | tee -a /tmp/print.log
     {command} 2>&1 | tee -a /tmp/print.log
@@ -320,69 +586,43 @@ while true; do
     sleep 2
 done
 """
-        result = subprocess.run(
-            ["docker", "exec", "-d", container_name, "/bin/bash", "-c", restart_cmd],
-            capture_output=True,
-            text=True
-        )
-        print(f"Print server started with auto-restart: {command}")
-        return result
     elif mode == "debug":
         # Start debug server in background
-        full_cmd = f"nohup {command} > /tmp/debug.log 2>&1 &"
-        result = subprocess.run(
-            ["docker", "exec", "-d", container_name, "/bin/bash", "-c", full_cmd],
-            capture_output=True,
-            text=True
-        )
-        print(f"Debug server started: {command}")
-        return result
+        script = f"nohup {command} > /tmp/debug.log 2>&1 &"
     else:
         # Flash mode - run synchronously
-        result = subprocess.run(
-            ["docker", "exec", container_name, "/bin/bash", "-c", command],
-            capture_output=True,
-            text=True,
-            timeout=120
-        )
-        print(result.stdout)
-        print(result.stderr, file=sys.stderr)
-        return result
-
-def maybe_run_lock_monitor():
-    """Internal entrypoint for lock monitor subprocess."""
-    if len(sys.argv) >= 2 and sys.argv[1] == "--lock-monitor":
-        if len(sys.argv) != 7:
-            print(
-                "Usage: debug_dispatcher.py --lock-monitor <lock_fd> <container> <probe_id> <mode> <interface>",
-                file=sys.stderr,
-            )
-            sys.exit(2)
+        script = command
+    if prelude:
+        script = f"{prelude}\n{script}"
 
-        lock_fd = int(sys.argv[2])
-        container_name = sys.argv[3]
-        probe_id = int(sys.argv[4])
-        mode = sys.argv[5]
-        interface = sys.argv[6]
-        run_lock_monitor(lock_fd, container_name, probe_id, mode, interface)
-        sys.exit(0)
+    if mode not in ("debug", "print"):
+        # Flash output is forwarded as the tool produces it.
+        return docker_exec_stream(container_name, ["/bin/bash", "-c", script], timeout=120)
 
-def main():
-    maybe_run_lock_monitor()
+    result = docker_exec(container_name, ["/bin/bash", "-c", script], detach=True)
+    if mode == "print":
+        print(f"Print server started with auto-restart: {command}")
+    else:
+        print(f"Debug server started: {command}")
+    return result
 
-    if len(sys.argv) < 4:
+def main(argv=None):
+    """Run one dispatch; argv excludes the program name (defaults to sys.argv[1:])."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) < 3:
         print(
             "Usage: debug_dispatcher.py <target> <probe_id> <mode> [firmware_file] [transport] [uart_baud]",
             file=sys.stderr,
         )
         sys.exit(1)
 
-    target_name = sys.argv[1]
-    probe_id = int(sys.argv[2])
-    mode = sys.argv[3].strip().lower()
-    firmware_file = sys.argv[4] if len(sys.argv) > 4 else ""
-    requested_transport = sys.argv[5] if len(sys.argv) > 5 else ""
-    uart_baud_raw = sys.argv[6] if len(sys.argv) > 6 else ""
+    target_name = argv[0]
+    probe_id = int(argv[1])
+    mode = argv[2].strip().lower()
+    firmware_file = argv[3] if len(argv) > 3 else ""
+    requested_transport = argv[4] if len(argv) > 4 else ""
+    uart_baud_raw = argv[5] if len(argv) > 5 else ""
 
     if mode not in ["debug", "flash", "print"]:
         print(f"Error: Invalid mode '{mode}'. Must be 'debug', 'flash', or 'print'", file=sys.stderr)
@@ -457,7 +697,7 @@ def main():
     container_name = f"{base_container_name}-p{probe_id}"
 
     # Acquire lock
-    lock_file = acquire_lock(probe_id)
+    lock_fd = acquire_lock(probe_id)
     lock_transferred = False
 
     try:
@@ -471,22 +711,22 @@ def main():
             print(f"Error: No command defined for target={target_name}, interface={interface}, mode={mode}", file=sys.stderr)
             sys.exit(1)
 
-        # Format command with parameters
-        firmware_path = f"/work/{firmware_file}" if firmware_file else ""
-        device_path = config.get_probe_device_path(probe_id) or ""
-
-        command = config.format_command(
-            command_template,
-            serial=probe.get('serial', ''),
-            gdb_port=get_gdb_port(probe_id),
-            telnet_port=get_telnet_port(probe_id),
-            rtt_port=get_rtt_port(probe_id),
-            print_port=get_rtt_port(probe_id),
-            transport=transport or "",
-            uart_baud=uart_baud,
-            device_path=device_path,
-            firmware_path=firmware_path
-        )
+        # Format command with parameters; each value is only produced if the
+        # template actually references it.
+        gdb_port = config.gdb_base_port + probe_id
+        rtt_port = config.rtt_base_port + probe_id
+        template_args = LazyTemplateArgs({
+            "serial": lambda: probe.get('serial', ''),
+            "gdb_port": lambda: gdb_port,
+            "telnet_port": lambda: config.telnet_base_port + probe_id,
+            "rtt_port": lambda: rtt_port,
+            "print_port": lambda: rtt_port,
+            "transport": lambda: transport or "",
+            "uart_baud": lambda: uart_baud,
+            "device_path": lambda: config.get_probe_device_path(probe_id) or "",
+            "firmware_path": lambda: f"/work/{firmware_file}" if firmware_file else "",
+        })
+        command = config.format_command_map(command_template, template_args)
 
         print(f"Target: {target_name}", file=sys.stderr)
         print(f"Probe: {probe['name']} (ID: {probe_id})", file=sys.stderr)
@@ -496,14 +736,16 @@ def main():
         print(f"Container: {container_name}", file=sys.stderr)
         print(f"Command: {command}", file=sys.stderr)
 
-        # Cleanup existing processes in debug or print mode
+        # Cleanup existing processes in debug or print mode, in the same
+        # exec that launches the new session.
+        prelude = None
         if mode in ["debug", "print"]:
-            cleanup_existing_processes(container_name, probe_id, interface)
+            prelude = cleanup_script(probe_id, interface, gdb_port=gdb_port, rtt_port=rtt_port)
 
         # Execute command
-        result = execute_command(container_name, command, mode, probe_id)
+        result = execute_command(container_name, command, mode, probe_id, prelude=prelude)
         if mode in ["debug", "print"] and result.returncode == 0:
-            start_lock_monitor(lock_file, container_name, probe_id, mode, interface)
+            start_lock_monitor(lock_fd, container_name, probe_id, mode, interface)
             lock_transferred = True
 
         sys.exit(result.returncode)
@@ -511,8 +753,8 @@ def main():
     finally:
         # Release lock unless it was transferred to monitor process.
         if not lock_transferred:
-            fcntl.flock(lock_file, fcntl.LOCK_UN)
-        lock_file.close()
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
 
 if __name__ == '__main__':
     main()
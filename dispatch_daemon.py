@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Pre-warmed dispatcher process
+Keeps debug_dispatcher and the parsed config imported in one long-lived
+process and forks a worker per dispatch, so a request skips interpreter
+start-up and imports. The API server talks to it over a socketpair.
+
+Each request is one SOCK_SEQPACKET message carrying the dispatcher argv
+(JSON) plus, via SCM_RIGHTS, one end of a fresh socketpair. The worker
+announces its pid on that socket, then its merged stdout/stderr follows,
+ending with an exit trailer. The worker writes the trailer itself before
+exiting and the daemon writes another once it has reaped the worker, so
+the exit status survives either one dying.
+"""
+import array
+import json
+import os
+import signal
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+EXIT_TRAILER = b"\0dispatch-exit:"
+PID_HEADER = b"\0dispatch-pid:"
+READY_MESSAGE = b"ready"
+START_TIMEOUT_SECONDS = 10
+MAX_REQUEST_BYTES = 64 * 1024
+_FD_SIZE = array.array("i").itemsize
+
+
+class DaemonUnavailable(Exception):
+    """Raised when the daemon cannot take a request; callers spawn the dispatcher instead."""
+
+
+def split_exit_trailer(output):
+    """
+    Split worker output into (returncode, log).
+
+    The log is a memoryview over `output` (no copy of a possibly large
+    buffer). The returncode is None when no trailer arrived: the worker
+    was killed and the daemon died before it could report that.
+    """
+    view = memoryview(output)
+    idx = output.rfind(EXIT_TRAILER)
+    if idx < 0:
+        return None, view
+    try:
+        returncode = int(output[idx + len(EXIT_TRAILER):].strip())
+    except ValueError:
+        return None, view
+    # Worker and daemon trailers agree; the log ends at the first one.
+    return returncode, view[:output.find(EXIT_TRAILER)]
+
+
+def read_worker_pid(sock, deadline):
+    """
+    Consume the worker's pid announcement from the start of its output.
+
+    Returns:
+        The worker pid (also its process group), or None if the stream does
+        not start with one: no worker was forked, and any message the
+        daemon wrote instead is left unread.
+    """
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        readable, _, _ = select.select([sock], [], [], remaining)
+        if not readable:
+            return None
+        head = sock.recv(64, socket.MSG_PEEK)
+        if not head or not head.startswith(PID_HEADER[:len(head)]):
+            return None
+        end = head.find(b"\n")
+        if end >= 0:
+            sock.recv(end + 1)
+            try:
+                return int(head[len(PID_HEADER):end])
+            except ValueError:
+                return None
+        if len(head) >= 64:
+            return None
+        # Header split across writes: wait for the rest.
+        time.sleep(0.001)
+
+
+def kill_worker(pid):
+    """Kill a worker's process group (for when the daemon cannot)."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class DispatcherDaemon:
+    """Server-side handle: starts the daemon and submits requests to it."""
+
+    def __init__(self):
+        self.proc = None
+        self.control = None
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, str(Path(__file__).resolve()), str(child.fileno())],
+                pass_fds=[child.fileno()],
+                stdin=subprocess.DEVNULL,
+            )
+        except Exception:
+            parent.close()
+            raise
+        finally:
+            child.close()
+
+        # Wait until the daemon has finished importing, so a daemon that
+        # cannot start is noticed here rather than by the first request.
+        parent.settimeout(START_TIMEOUT_SECONDS)
+        try:
+            ready = parent.recv(len(READY_MESSAGE))
+        except OSError:
+            ready = b""
+        if ready != READY_MESSAGE:
+            parent.close()
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+            raise RuntimeError("dispatcher daemon did not report ready")
+        parent.settimeout(None)
+        self.control = parent
+
+    def submit(self, argv, timeout):
+        """
+        Start one dispatch and return the socket its output arrives on.
+
+        Raises:
+            DaemonUnavailable: if the daemon is not running or the request cannot be sent
+        """
+        with self._lock:
+            if self.closed:
+                raise DaemonUnavailable("dispatcher daemon is shut down")
+            if self.proc is None or self.proc.poll() is not None:
+                # Died (or never started): replace it before giving up.
+                if self.control is not None:
+                    self.control.close()
+                    self.control = None
+                try:
+                    self.start()
+                except Exception as e:
+                    raise DaemonUnavailable(f"cannot start dispatcher daemon: {e}")
+            control = self.control
+
+        ours, theirs = socket.socketpair()
+        try:
+            payload = json.dumps({"argv": list(argv), "timeout": timeout}).encode()
+            fds = array.array("i", [theirs.fileno()])
+            control.sendmsg([payload], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+        except OSError as e:
+            ours.close()
+            raise DaemonUnavailable(str(e))
+        finally:
+            theirs.close()
+        return ours
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+        if self.control is not None:
+            # The daemon exits when the control socket reaches EOF.
+            self.control.close()
+            self.control = None
+        if self.proc is not None:
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+
+
+def _exit_status(status):
+    """Popen-style return code: exit status, or -signal if killed."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_worker(argv, conn_fd, inherited_fds):
+    """Worker body (in the forked child): run the dispatcher, then _exit."""
+    code = 1
+    try:
+        # Own process group so a timeout kills the whole tree; the lock
+        # monitor calls setsid() again and is unaffected.
+        os.setsid()
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for fd in inherited_fds:
+            os.close(fd)
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        os.dup2(conn_fd, 1)
+        os.dup2(conn_fd, 2)
+        os.close(conn_fd)
+        os.write(1, PID_HEADER + b"%d\n" % os.getpid())
+
+        import debug_dispatcher
+        debug_dispatcher.main(argv)
+        code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.write(1, EXIT_TRAILER + b"%d\n" % (code & 0xFF))
+        except OSError:
+            pass
+        finally:
+            os._exit(code)
+
+
+def _recv_request(control):
+    """Receive one request; returns (argv, timeout, conn_fd), or None at EOF."""
+    msg, ancdata, _flags, _addr = control.recvmsg(
+        MAX_REQUEST_BYTES, socket.CMSG_SPACE(_FD_SIZE)
+    )
+    fds = array.array("i")
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % _FD_SIZE)])
+    if not msg and not fds:
+        return None
+    if not fds:
+        return (), 0, None
+
+    conn_fd = fds[0]
+    for extra in fds[1:]:
+        os.close(extra)
+    try:
+        request = json.loads(msg)
+        argv = [str(arg) for arg in request["argv"]]
+        timeout = float(request["timeout"])
+    except (ValueError, KeyError, TypeError):
+        os.write(conn_fd, b"Error: malformed dispatch request\n" + EXIT_TRAILER + b"1\n")
+        os.close(conn_fd)
+        return (), 0, None
+    return argv, timeout, conn_fd
+
+
+def serve(control):
+    """Daemon loop: fork a worker per request until the server goes away."""
+    # Loaded once here; every worker inherits them already imported.
+    import debug_dispatcher  # noqa: F401
+    from config_loader import get_config
+
+    try:
+        get_config()
+    except Exception as e:
+        # Not fatal: each request reloads it and reports the error.
+        print(f"[WARN] Dispatcher daemon could not load config: {e}", file=sys.stderr)
+
+    # SIGCHLD wakes select() through this pipe, so workers are reaped and
+    # answered as soon as they exit.
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    control.send(READY_MESSAGE)
+
+    jobs = {}  # worker pid -> [conn fd, deadline, killed]
+    while True:
+        now = time.monotonic()
+        pending = [job[1] for job in jobs.values() if not job[2]]
+        timeout = max(min(pending) - now, 0) if pending else None
+        try:
+            readable, _, _ = select.select([control, wake_r], [], [], timeout)
+        except InterruptedError:
+            readable = []
+
+        if wake_r in readable:
+            try:
+                while os.read(wake_r, 512):
+                    pass
+            except BlockingIOError:
+                pass
+
+        while jobs:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            job = jobs.pop(pid, None)
+            if job is None:
+                continue
+            try:
+                os.write(job[0], EXIT_TRAILER + b"%d\n" % _exit_status(status))
+            except OSError:
+                # Server gave up on this request (timeout or disconnect).
+                pass
+            os.close(job[0])
+
+        now = time.monotonic()
+        for pid, job in jobs.items():
+            if not job[2] and job[1] <= now:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                job[2] = True
+
+        if control in readable:
+            request = _recv_request(control)
+            if request is None:
+                break
+            argv, request_timeout, conn_fd = request
+            if conn_fd is None:
+                continue
+
+            # Pick up config.yml edits here so workers inherit the reload.
+            try:
+                get_config()
+            except Exception as e:
+                os.write(conn_fd, f"Error: cannot load config: {e}\n".encode() + EXIT_TRAILER + b"1\n")
+                os.close(conn_fd)
+                continue
+            inherited = [control.fileno(), wake_r, wake_w] + [job[0] for job in jobs.values()]
+            pid = os.fork()
+            if pid == 0:
+                _run_worker(argv, conn_fd, inherited)
+            jobs[pid] = [conn_fd, time.monotonic() + request_timeout, False]
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: dispatch_daemon.py <control_fd>", file=sys.stderr)
+        sys.exit(1)
+    control = socket.socket(fileno=int(sys.argv[1]))
+    serve(control)
+
+
+if __name__ == "__main__":
+    main()
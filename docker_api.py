@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Minimal Docker Engine API client
+Talks to dockerd over its unix socket so short RPCs such as `exec` skip
+spawning the docker CLI.
+"""
+import http.client
+import json
+import os
+import socket
+import struct
+import subprocess
+import time
+from urllib.parse import quote
+
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
+EXIT_CODE_POLL_ATTEMPTS = 20
+EXIT_CODE_POLL_SECONDS = 0.05
+
+
+class DockerUnavailable(Exception):
+    """Raised when the Engine API socket cannot be used; callers fall back to the CLI."""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+        self.unix_timeout = timeout
+        # http.client drops self.sock once a read-until-close response is
+        # handed out; keep our own handle so stream reads can adjust timeouts.
+        self.unix_sock = None
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.unix_timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self.unix_sock = sock
+
+
+def docker_socket_path():
+    """Resolve the Engine API socket, honouring DOCKER_HOST like the CLI does."""
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if not docker_host:
+        return DEFAULT_DOCKER_SOCKET
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+    # tcp:// or ssh:// hosts are left to the docker CLI.
+    return None
+
+
+def _open(method, path, body=None, timeout=None):
+    """Send one API request and return (connection, response)."""
+    socket_path = docker_socket_path()
+    if not socket_path:
+        raise DockerUnavailable("DOCKER_HOST is not a unix socket")
+
+    conn = _UnixHTTPConnection(socket_path, timeout=timeout)
+    headers = {}
+    payload = None
+    if body is not None:
+        payload = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        resp = conn.getresponse()
+    except (FileNotFoundError, PermissionError, ConnectionRefusedError) as e:
+        conn.close()
+        raise DockerUnavailable(str(e))
+    except Exception:
+        conn.close()
+        raise
+    return conn, resp
+
+
+def _decode_body(raw):
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {"message": raw.decode("utf-8", "replace").strip()}
+
+
+def request_json(method, path, body=None, timeout=None):
+    """Send one API request and return (status, decoded JSON body or None)."""
+    conn, resp = _open(method, path, body=body, timeout=timeout)
+    try:
+        raw = resp.read()
+    finally:
+        conn.close()
+    return resp.status, _decode_body(raw)
+
+
+def container_running(container_name: str) -> bool:
+    """
+    Report whether a container exists and is running.
+
+    Raises:
+        DockerUnavailable: if the Engine API socket cannot be reached
+    """
+    status, data = request_json(
+        "GET", f"/containers/{quote(container_name, safe='')}/json", timeout=5
+    )
+    if status != 200 or not isinstance(data, dict):
+        return False
+    return bool((data.get("State") or {}).get("Running"))
+
+
+def list_containers(name_regex):
+    """
+    List all containers (running or not) whose name matches a regex, like
+    `docker ps -a --filter name=<regex>`.
+
+    Returns:
+        dict: container name -> running (bool)
+
+    Raises:
+        DockerUnavailable: if the Engine API socket cannot be reached or the
+            listing fails
+    """
+    filters = quote(json.dumps({"name": [name_regex]}), safe="")
+    status, data = request_json("GET", f"/containers/json?all=1&filters={filters}", timeout=5)
+    if status != 200 or not isinstance(data, list):
+        raise DockerUnavailable(f"container listing failed (HTTP {status})")
+
+    containers = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        running = entry.get("State") == "running"
+        # Names carry a leading "/" in the Engine API.
+        for name in entry.get("Names") or []:
+            containers[name.lstrip("/")] = running
+    return containers
+
+
+def _error_result(argv, data):
+    message = data.get("message", "") if isinstance(data, dict) else ""
+    return subprocess.CompletedProcess(
+        args=argv,
+        returncode=1,
+        stdout="",
+        stderr=f"Error response from daemon: {message}\n",
+    )
+
+
+def _read_multiplexed(conn, resp, deadline, sinks):
+    """
+    Demultiplex a non-TTY exec stream, passing each payload to its sink.
+
+    Each frame is an 8-byte header (stream type, 3 pad bytes, big-endian
+    length) followed by the payload. `sinks` maps stream type (1 stdout,
+    2 stderr) to a callable taking bytes.
+    """
+    while True:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("exec output timed out")
+            conn.unix_sock.settimeout(remaining)
+        header = resp.read(8)
+        if len(header) < 8:
+            break
+        stream_type, size = struct.unpack(">BxxxL", header)
+        payload = resp.read(size)
+        sinks.get(stream_type, sinks[1])(payload)
+
+
+def _exit_code(exec_id):
+    """Read the exit code of a finished exec instance."""
+    for _ in range(EXIT_CODE_POLL_ATTEMPTS):
+        status, data = request_json("GET", f"/exec/{exec_id}/json")
+        if status == 200 and isinstance(data, dict):
+            if not data.get("Running") and data.get("ExitCode") is not None:
+                return data["ExitCode"]
+        time.sleep(EXIT_CODE_POLL_SECONDS)
+    return 1
+
+
+def _start_exec(container_name, argv, detach, timeout):
+    """
+    Create and start an exec instance.
+
+    Returns:
+        (exec_id, conn, resp) on success, or (None, None, error CompletedProcess)
+    """
+    status, data = request_json(
+        "POST",
+        f"/containers/{quote(container_name, safe='')}/exec",
+        body={
+            "Cmd": list(argv),
+            "AttachStdout": not detach,
+            "AttachStderr": not detach,
+        },
+        timeout=timeout,
+    )
+    if status != 201 or not isinstance(data, dict) or "Id" not in data:
+        return None, None, _error_result(argv, data)
+    exec_id = data["Id"]
+
+    conn, resp = _open(
+        "POST",
+        f"/exec/{exec_id}/start",
+        body={"Detach": detach, "Tty": False},
+        timeout=timeout,
+    )
+    if resp.status != 200:
+        try:
+            error = _error_result(argv, _decode_body(resp.read()))
+        finally:
+            conn.close()
+        return None, None, error
+    return exec_id, conn, resp
+
+
+def exec_run(container_name, argv, detach=False, timeout=None):
+    """
+    Run argv inside a container, like `docker exec [-d] <container> argv...`.
+
+    Returns:
+        subprocess.CompletedProcess with text stdout/stderr
+
+    Raises:
+        DockerUnavailable: if the Engine API socket cannot be reached
+        subprocess.TimeoutExpired: if output is not complete within timeout
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    exec_id, conn, resp = _start_exec(container_name, argv, detach, timeout)
+    if exec_id is None:
+        return resp
+
+    stdout = bytearray()
+    stderr = bytearray()
+    try:
+        if detach:
+            resp.read()
+            return subprocess.CompletedProcess(args=argv, returncode=0, stdout="", stderr="")
+
+        try:
+            _read_multiplexed(conn, resp, deadline, {1: stdout.extend, 2: stderr.extend})
+        except socket.timeout:
+            raise subprocess.TimeoutExpired(argv, timeout)
+    finally:
+        conn.close()
+
+    return subprocess.CompletedProcess(
+        args=argv,
+        returncode=_exit_code(exec_id),
+        stdout=stdout.decode("utf-8", "replace"),
+        stderr=stderr.decode("utf-8", "replace"),
+    )
+
+
+def exec_stream(container_name, argv, stdout, stderr, timeout=None):
+    """
+    Run argv inside a container, forwarding output as it arrives.
+
+    `stdout`/`stderr` are callables receiving raw bytes chunks.
+
+    Returns:
+        subprocess.CompletedProcess with empty stdout/stderr (output was streamed)
+
+    Raises:
+        DockerUnavailable: if the Engine API socket cannot be reached
+        subprocess.TimeoutExpired: if output is not complete within timeout
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    exec_id, conn, resp = _start_exec(container_name, argv, False, timeout)
+    if exec_id is None:
+        stderr(resp.stderr.encode("utf-8"))
+        return resp
+
+    try:
+        _read_multiplexed(conn, resp, deadline, {1: stdout, 2: stderr})
+    except socket.timeout:
+        raise subprocess.TimeoutExpired(argv, timeout)
+    finally:
+        conn.close()
+
+    return subprocess.CompletedProcess(
+        args=argv, returncode=_exit_code(exec_id), stdout="", stderr=""
+    )
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+File close notifications via inotify
+Lets callers block until another process closes a file (for example,
+releases a lock file) instead of polling it.
+"""
+import ctypes
+import errno
+import os
+import select
+import time
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT_BUFSIZE = 4096
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        # The process's own symbol namespace already includes libc.
+        _libc = ctypes.CDLL(None, use_errno=True)
+    return _libc
+
+
+class FileCloseWatcher:
+    """
+    Block until a file is closed (or its attributes change).
+
+    Without inotify the watcher degrades to a plain sleep so callers keep
+    a single code path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        try:
+            libc = _load_libc()
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        mask = IN_CLOSE_WRITE | IN_CLOSE_NOWRITE | IN_ATTRIB
+        if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+
+    @property
+    def available(self):
+        return self.fd is not None
+
+    def wait(self, timeout):
+        """
+        Wait up to `timeout` seconds for an event on the file.
+
+        Returns:
+            bool: True if an event arrived, False on timeout
+        """
+        if self.fd is None:
+            time.sleep(timeout)
+            return False
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return False
+            try:
+                # Any event means "check again"; the payload is not needed.
+                if os.read(self.fd, _EVENT_BUFSIZE):
+                    return True
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -10,12 +10,41 @@ in a shared container, while still reusing the same image.
 from __future__ import annotations
 
 import argparse
-from collections import defaultdict
 from pathlib import Path
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, List, Set, Tuple
 
 import yaml
 
+from config_loader import load_config_data
+
+try:
+    from yaml import CSafeDumper as _Dumper, CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeDumper as _Dumper, SafeLoader as _Loader
+
+
+class _ComposeDumper(_Dumper):
+    """Dumper that writes shared service values inline instead of as YAML aliases."""
+
+    def ignore_aliases(self, data):
+        return True
+
+
+# Fields shared by every probe instance; build_service only overrides names.
+_SERVICE_TEMPLATE: Dict[str, Any] = {
+    "image": None,
+    "container_name": None,
+    "privileged": True,
+    "volumes": [
+        "/dev:/dev",
+        "/tmp/flash_staging:/work",
+        "./config.yml:/config.yml:ro",
+    ],
+    "command": "sleep infinity",
+    "network_mode": "host",
+    "restart": "unless-stopped",
+}
+
 
 def build_service(
     base_container_name: str,
@@ -25,27 +54,20 @@ def build_service(
     include_build: bool,
 ) -> Dict[str, Any]:
     instance_name = f"{base_container_name}-p{probe_id}"
+    # The volumes list is shared with the template; treat it as read-only.
     service: Dict[str, Any] = {
+        **_SERVICE_TEMPLATE,
         "image": f"{image_name}:latest",
         "container_name": instance_name,
-        "privileged": True,
-        "volumes": [
-            "/dev:/dev",
-            "/tmp/flash_staging:/work",
-            "./config.yml:/config.yml:ro",
-        ],
-        "command": "sleep infinity",
-        "network_mode": "host",
-        "restart": "unless-stopped",
     }
     if include_build:
         service["build"] = {"context": build_context, "dockerfile": "Dockerfile"}
     return service
 
 
-def build_interface_container_map(targets: Dict[str, Any]) -> Dict[str, Set[str]]:
-    """Map probe interface -> container keys that can serve that interface."""
-    interface_to_containers: Dict[str, Set[str]] = defaultdict(set)
+def build_interface_container_map(targets: Dict[str, Any]) -> Dict[str, Tuple[str, ...]]:
+    """Map probe interface -> sorted container keys that can serve that interface."""
+    interface_to_containers: Dict[str, Set[str]] = {}
 
     for target in targets.values():
         container_cfg = target.get("container")
@@ -75,18 +97,22 @@ def build_interface_container_map(targets: Dict[str, Any]) -> Dict[str, Set[str]
                     interface_container_map[interface] = resolved
 
         for interface, container_key in interface_container_map.items():
-            interface_to_containers[interface].add(container_key)
+            interface_to_containers.setdefault(interface, set()).add(container_key)
 
-    return interface_to_containers
+    # Sort once here so per-probe lookups iterate a ready-made tuple.
+    return {
+        interface: tuple(sorted(container_keys))
+        for interface, container_keys in interface_to_containers.items()
+    }
 
 
 def resolve_container_probe_ids(
     containers: Dict[str, Dict[str, Any]],
     probes: List[Dict[str, Any]],
-    interface_to_containers: Dict[str, Set[str]],
+    interface_to_containers: Dict[str, Tuple[str, ...]],
 ) -> Dict[str, List[int]]:
     """Map container key -> compatible probe IDs."""
-    container_probe_ids: Dict[str, List[int]] = {key: [] for key in containers.keys()}
+    container_probe_ids: Dict[str, Set[int]] = {key: set() for key in containers.keys()}
 
     for probe in probes:
         probe_id = int(probe["id"])
@@ -94,19 +120,18 @@ def resolve_container_probe_ids(
         if not probe_interface:
             continue
 
-        container_keys = interface_to_containers.get(probe_interface, set())
-        for container_key in sorted(container_keys):
+        for container_key in interface_to_containers.get(probe_interface, ()):
             if container_key not in containers:
                 raise ValueError(
                     f"Target references unknown container '{container_key}' "
                     f"for probe interface '{probe_interface}'."
                 )
-            container_probe_ids[container_key].append(probe_id)
+            container_probe_ids[container_key].add(probe_id)
 
-    for container_key, probe_ids in container_probe_ids.items():
-        container_probe_ids[container_key] = sorted(set(probe_ids))
-
-    return container_probe_ids
+    return {
+        container_key: sorted(probe_ids)
+        for container_key, probe_ids in container_probe_ids.items()
+    }
 
 
 def load_override_build_settings(override_path: Path) -> Dict[str, Dict[str, Any]]:
@@ -114,7 +139,8 @@ def load_override_build_settings(override_path: Path) -> Dict[str, Dict[str, Any
     if not override_path.exists():
         return {}
 
-    raw = yaml.safe_load(override_path.read_text()) or {}
+    with override_path.open("rb") as f:
+        raw = yaml.load(f, Loader=_Loader) or {}
     services = raw.get("services", {})
     build_settings: Dict[str, Dict[str, Any]] = {}
 
@@ -134,8 +160,9 @@ def merge_build_config(
 
     for key, value in override_build.items():
         if key == "args":
-            base_args = merged.get("args", {})
-            merged["args"] = {**base_args, **value}
+            args = dict(merged.get("args") or {})
+            args.update(value)
+            merged["args"] = args
         else:
             merged[key] = value
 
@@ -143,7 +170,8 @@ def merge_build_config(
 
 
 def generate(config_path: Path, override_path: Path) -> Dict[str, Any]:
-    config = yaml.safe_load(config_path.read_text())
+    # Via config_loader's parsed-config sidecar; the data is only read here.
+    config = load_config_data(config_path)
 
     containers = config.get("containers", {})
     probes = config.get("probes", [])
@@ -214,7 +242,8 @@ def main() -> None:
     override_path = Path(args.override)
 
     compose = generate(config_path, override_path)
-    out_path.write_text(yaml.safe_dump(compose, sort_keys=False))
+    with out_path.open("w") as f:
+        yaml.dump(compose, f, Dumper=_ComposeDumper, sort_keys=False)
     print(f"Wrote {out_path}")
 
 
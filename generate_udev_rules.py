@@ -2,18 +2,21 @@
 """
 Generate udev rules from config.yml
 """
-import yaml
 import sys
 from pathlib import Path
+from config_loader import load_config_data
 
 def load_config(config_path):
-    with open(config_path, 'r') as f:
-        return yaml.safe_load(f)
+    # Shares config_loader's parsed-config sidecar, so reruns skip YAML parsing.
+    return load_config_data(config_path)
 
 def generate_udev_rules(config):
-    rules = []
-    rules.append("# Auto-generated udev rules for Debug Probe Hub")
-    rules.append("# Generated from config.yml\n")
+    # One line per list entry; blank entries separate rules. Joined once.
+    parts = [
+        "# Auto-generated udev rules for Debug Probe Hub",
+        "# Generated from config.yml",
+        "",
+    ]
 
     for probe in config['probes']:
         probe_id = probe['id']
@@ -23,54 +26,29 @@ def generate_udev_rules(config):
         serial = probe.get('serial', '')
         interface = probe.get('interface', '')
 
-        # Create rule with serial number match
+        # Match with serial number when known (otherwise less specific).
+        match = (
+            f'ATTRS{{idVendor}}=="{vendor_id}", '
+            f'ATTRS{{idProduct}}=="{product_id}", '
+        )
         if serial:
-            rule = (
-                f'# {name}\n'
-                f'SUBSYSTEM=="usb", '
-                f'ATTRS{{idVendor}}=="{vendor_id}", '
-                f'ATTRS{{idProduct}}=="{product_id}", '
-                f'ATTRS{{serial}}=="{serial}", '
-                f'MODE="0666", '
-                f'SYMLINK+="probes/probe_{probe_id}"\n'
-            )
-        else:
-            # Rule without serial (less specific)
-            rule = (
-                f'# {name}\n'
-                f'SUBSYSTEM=="usb", '
-                f'ATTRS{{idVendor}}=="{vendor_id}", '
-                f'ATTRS{{idProduct}}=="{product_id}", '
-                f'MODE="0666", '
-                f'SYMLINK+="probes/probe_{probe_id}"\n'
-            )
+            match += f'ATTRS{{serial}}=="{serial}", '
 
-        rules.append(rule)
+        parts.extend((
+            f'# {name}',
+            f'SUBSYSTEM=="usb", {match}MODE="0666", SYMLINK+="probes/probe_{probe_id}"',
+            "",
+        ))
 
         # USB-UART probe also gets a stable TTY symlink.
         if interface == "usb-uart":
-            if serial:
-                tty_rule = (
-                    f'# {name} (TTY)\n'
-                    f'SUBSYSTEM=="tty", '
-                    f'ATTRS{{idVendor}}=="{vendor_id}", '
-                    f'ATTRS{{idProduct}}=="{product_id}", '
-                    f'ATTRS{{serial}}=="{serial}", '
-                    f'MODE="0666", '
-                    f'SYMLINK+="probes/tty_probe_{probe_id}"\n'
-                )
-            else:
-                tty_rule = (
-                    f'# {name} (TTY)\n'
-                    f'SUBSYSTEM=="tty", '
-                    f'ATTRS{{idVendor}}=="{vendor_id}", '
-                    f'ATTRS{{idProduct}}=="{product_id}", '
-                    f'MODE="0666", '
-                    f'SYMLINK+="probes/tty_probe_{probe_id}"\n'
-                )
-            rules.append(tty_rule)
+            parts.extend((
+                f'# {name} (TTY)',
+                f'SUBSYSTEM=="tty", {match}MODE="0666", SYMLINK+="probes/tty_probe_{probe_id}"',
+                "",
+            ))
 
-    return '\n'.join(rules)
+    return "\n".join(parts)
 
 def main():
     config_path = Path(__file__).parent / 'config.yml'
@@ -84,8 +62,18 @@ def main():
 
     # Write to stdout or file
     output_path = Path(__file__).parent / '99-debug-probe-hub.rules'
-    with open(output_path, 'w') as f:
-        f.write(rules)
+    rules_bytes = rules.encode()
+    try:
+        unchanged = output_path.read_bytes() == rules_bytes
+    except FileNotFoundError:
+        unchanged = False
+    if unchanged:
+        # Leave the file (and its mtime) alone so nothing needs reloading.
+        print(f"Udev rules unchanged: {output_path}")
+        return
+
+    with open(output_path, 'wb') as f:
+        f.write(rules_bytes)
 
     print(f"Generated udev rules: {output_path}")
     print("\nTo install:")
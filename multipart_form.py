@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Streaming multipart/form-data parser
+Reads a request body in fixed-size chunks, keeping plain fields in memory
+and writing an uploaded file straight to disk. Small
+application/x-www-form-urlencoded bodies are accepted too.
+"""
+import email
+import os
+import tempfile
+from email.message import Message
+from urllib.parse import parse_qsl
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+# urlencoded bodies carry only text fields and are read whole.
+MAX_URLENCODED_BYTES = 64 * 1024
+# Limit for one text (non-file) multipart field, which is kept in memory.
+MAX_FIELD_BYTES = 64 * 1024
+
+
+def _current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Uploads get the mode a plain open() would give them (mkstemp uses 0600);
+# containers mounting the upload dir rely on it. Read once, at import.
+UPLOAD_FILE_MODE = 0o666 & ~_current_umask()
+
+
+class MultipartForm:
+    """Parsed form: text fields plus at most one uploaded file on disk."""
+
+    def __init__(self):
+        self.fields = {}
+        self.filename = None
+        self.file_path = None
+        self.file_size = 0
+
+    def save_file(self, dest_path):
+        """Move the uploaded file into place (atomic within the upload dir)."""
+        os.replace(self.file_path, dest_path)
+        self.file_path = None
+
+    def discard(self):
+        """Remove the uploaded file if it was not saved."""
+        if self.file_path:
+            try:
+                os.unlink(self.file_path)
+            except FileNotFoundError:
+                pass
+            self.file_path = None
+
+
+class _BodyReader:
+    """Buffered view of at most `length` bytes from a request stream."""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+        # A leading CRLF lets the first boundary match the same
+        # "\r\n--boundary" delimiter as every later one.
+        self.buf = bytearray(b"\r\n")
+
+    def fill(self):
+        """Read the next chunk into the buffer; False at end of body."""
+        if self.remaining <= 0:
+            return False
+        chunk = self.rfile.read(min(CHUNK_SIZE, self.remaining))
+        if not chunk:
+            self.remaining = 0
+            return False
+        self.remaining -= len(chunk)
+        self.buf += chunk
+        return True
+
+    def drain(self):
+        """Consume whatever is left of the body (epilogue)."""
+        while self.fill():
+            self.buf.clear()
+
+
+def multipart_boundary(content_type):
+    """
+    Extract the boundary from a multipart/form-data Content-Type.
+
+    Raises:
+        ValueError: if the type is not multipart/form-data or has no boundary
+    """
+    msg = Message()
+    msg["content-type"] = content_type
+    if msg.get_content_type() != "multipart/form-data":
+        raise ValueError(f"Unsupported Content-Type: {content_type}")
+    boundary = msg.get_param("boundary")
+    if not boundary:
+        raise ValueError("Multipart boundary missing")
+    return boundary.encode("latin-1")
+
+
+def _read_part_headers(reader):
+    """Read part headers up to the blank line and return them as a Message."""
+    while True:
+        end = reader.buf.find(b"\r\n\r\n")
+        if end > MAX_HEADER_BYTES:
+            raise ValueError("Multipart part headers too large")
+        if end >= 0:
+            break
+        if len(reader.buf) > MAX_HEADER_BYTES:
+            raise ValueError("Multipart part headers too large")
+        if not reader.fill():
+            raise ValueError("Truncated multipart body")
+    header_bytes = bytes(reader.buf[:end + 4])
+    del reader.buf[:end + 4]
+    return email.message_from_bytes(header_bytes)
+
+
+def _write_prefix(buf, end, write):
+    """Pass buf[:end] to write() without copying it out of the buffer."""
+    # Views must be released before the bytearray is resized.
+    with memoryview(buf) as view, view[:end] as part:
+        write(part)
+
+
+def _copy_part_body(reader, delimiter, write):
+    """Pass part data to write() up to the next delimiter, which is consumed."""
+    keep = len(delimiter) - 1
+    while True:
+        idx = reader.buf.find(delimiter)
+        if idx >= 0:
+            if idx:
+                _write_prefix(reader.buf, idx, write)
+            del reader.buf[:idx + len(delimiter)]
+            return
+        # Hold back a delimiter-sized tail in case it straddles two chunks.
+        if len(reader.buf) > keep:
+            _write_prefix(reader.buf, len(reader.buf) - keep, write)
+            del reader.buf[:-keep]
+        if not reader.fill():
+            raise ValueError("Truncated multipart body")
+
+
+def _skip_preamble(reader, delimiter):
+    """Advance past the first delimiter; False if the body has none."""
+    keep = len(delimiter) - 1
+    while True:
+        idx = reader.buf.find(delimiter)
+        if idx >= 0:
+            del reader.buf[:idx + len(delimiter)]
+            return True
+        if len(reader.buf) > keep:
+            del reader.buf[:-keep]
+        if not reader.fill():
+            return False
+
+
+def _read_after_delimiter(reader):
+    """Return b"--" after the closing delimiter, b"\r\n" before another part."""
+    while len(reader.buf) < 2:
+        if not reader.fill():
+            raise ValueError("Truncated multipart body")
+    marker = bytes(reader.buf[:2])
+    if marker == b"--":
+        return marker
+    # Tolerate transport padding (whitespace) before the line break.
+    while True:
+        end = reader.buf.find(b"\r\n")
+        if end >= 0:
+            if reader.buf[:end].strip(b" \t"):
+                raise ValueError("Malformed multipart delimiter")
+            del reader.buf[:end + 2]
+            return b"\r\n"
+        if len(reader.buf) > MAX_HEADER_BYTES or not reader.fill():
+            raise ValueError("Malformed multipart delimiter")
+
+
+def parse_multipart(rfile, content_type, content_length, upload_dir):
+    """
+    Parse a multipart/form-data body from a stream.
+
+    Text fields are decoded into `fields`. A file field is written in chunks
+    to a temporary file in `upload_dir`; the caller either save_file()s it
+    or discard()s it. If several file fields are sent, the last one wins.
+
+    Raises:
+        ValueError: if the body is not well-formed multipart/form-data
+    """
+    delimiter = b"\r\n--" + multipart_boundary(content_type)
+    reader = _BodyReader(rfile, content_length)
+    form = MultipartForm()
+
+    try:
+        if not _skip_preamble(reader, delimiter):
+            # Empty body: no fields at all.
+            return form
+
+        while _read_after_delimiter(reader) != b"--":
+            headers = _read_part_headers(reader)
+            name = headers.get_param("name", header="content-disposition")
+            filename = headers.get_filename()
+
+            if filename:
+                form.discard()
+                fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-")
+                form.file_path = tmp_path
+                form.filename = os.path.basename(filename)
+                form.file_size = 0
+                with os.fdopen(fd, "wb") as f:
+                    os.fchmod(f.fileno(), UPLOAD_FILE_MODE)
+
+                    def write(data, f=f):
+                        f.write(data)
+                        form.file_size += len(data)
+                    _copy_part_body(reader, delimiter, write)
+            else:
+                value = bytearray()
+
+                def append(data, value=value):
+                    if len(value) + len(data) > MAX_FIELD_BYTES:
+                        raise ValueError(f"Form field too large (limit {MAX_FIELD_BYTES} bytes)")
+                    value.extend(data)
+                _copy_part_body(reader, delimiter, append)
+                if name:
+                    form.fields[name] = value.decode("utf-8", "replace")
+
+        reader.drain()
+    except BaseException:
+        form.discard()
+        raise
+
+    return form
+
+
+def parse_urlencoded(rfile, content_length):
+    """
+    Parse an application/x-www-form-urlencoded body into a form without a file.
+
+    Raises:
+        ValueError: if the body is larger than MAX_URLENCODED_BYTES
+    """
+    if content_length > MAX_URLENCODED_BYTES:
+        raise ValueError(f"Form body too large (limit {MAX_URLENCODED_BYTES} bytes)")
+    form = MultipartForm()
+    body = rfile.read(content_length) if content_length > 0 else b""
+    # Last value wins for repeated keys, as with multipart fields.
+    form.fields = dict(parse_qsl(body.decode("utf-8", "replace"), keep_blank_values=True))
+    return form
+
+
+def parse_form(rfile, content_type, content_length, upload_dir):
+    """
+    Parse a multipart/form-data or application/x-www-form-urlencoded body.
+
+    Raises:
+        ValueError: if the body is malformed or of another Content-Type
+    """
+    msg = Message()
+    msg["content-type"] = content_type
+    if msg.get_content_type() == "application/x-www-form-urlencoded":
+        return parse_urlencoded(rfile, content_length)
+    return parse_multipart(rfile, content_type, content_length, upload_dir)
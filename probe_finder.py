@@ -5,25 +5,73 @@ Find probes by interface name, VID/PID, or serial number
 """
 import json
 import sys
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
 from config_loader import get_config
 
+# Common aliases
+_INTERFACE_ALIASES = {
+    'jlink': ['jlink', 'segger', 'swd'],
+    'cmsisdap': ['cmsisdap', 'cmsis', 'dap'],
+    'wchlink': ['wchlink', 'wch', 'wchlinke'],
+}
+# Flattened once: alias -> canonical name.
+_ALIAS_MAP = {
+    alias: canonical
+    for canonical, aliases in _INTERFACE_ALIASES.items()
+    for alias in aliases
+}
+
+@lru_cache(maxsize=256)
 def normalize_interface_name(name: str) -> str:
     """Normalize interface name for matching"""
     name = name.lower().replace('-', '').replace('_', '')
+    return _ALIAS_MAP.get(name, name)
 
-    # Common aliases
-    aliases = {
-        'jlink': ['jlink', 'segger', 'swd'],
-        'cmsisdap': ['cmsisdap', 'cmsis', 'dap'],
-        'wchlink': ['wchlink', 'wch', 'wchlinke'],
-    }
+def parse_usb_id(value) -> Optional[int]:
+    """Parse a VID/PID hex string ("1366", "0x1366") to an int; None if invalid"""
+    try:
+        return int(value, 16)
+    except (TypeError, ValueError):
+        return None
 
-    for key, values in aliases.items():
-        if name in values:
-            return key
+class _ProbeIndex:
+    """
+    Probe search columns and lookup tables for one loaded config.
 
-    return name
+    Normalized fields are stored as parallel lists (one column per field,
+    indexed by probe position) beside the probe dicts, not in them, so API
+    output is unchanged. Lookup tables map a key to ascending positions,
+    so results keep config order.
+    """
+
+    def __init__(self, probes: List[Dict]):
+        self.probes: List[Dict] = list(probes)
+        # VID/PID as ints: one integer compare per probe instead of string ops.
+        self.vendor_ids = [parse_usb_id(p.get('vendor_id')) for p in self.probes]
+        self.product_ids = [parse_usb_id(p.get('product_id')) for p in self.probes]
+        self.interfaces = [normalize_interface_name(p.get('interface', '')) for p in self.probes]
+        self.names = [p.get('name', '').lower() for p in self.probes]
+        self.serials = [p.get('serial', '') for p in self.probes]
+        self.positions = range(len(self.probes))
+
+        self.by_serial: Dict[str, List[int]] = {}
+        self.by_vid_pid: Dict[Tuple[Optional[int], Optional[int]], List[int]] = {}
+        self.by_interface: Dict[str, List[int]] = {}
+        for i in self.positions:
+            self.by_serial.setdefault(self.serials[i], []).append(i)
+            self.by_vid_pid.setdefault((self.vendor_ids[i], self.product_ids[i]), []).append(i)
+            self.by_interface.setdefault(self.interfaces[i], []).append(i)
+
+    def select(self, positions) -> List[Dict]:
+        """Materialize probe dicts for the given positions."""
+        probes = self.probes
+        return [probes[i] for i in positions]
+
+@lru_cache(maxsize=1)
+def _probe_index(config) -> _ProbeIndex:
+    """Search index for a loaded config; a reloaded config gets a new one."""
+    return _ProbeIndex(config.get_all_probes())
 
 def find_probes_by_interface(interface_name: str) -> List[Dict]:
     """
@@ -35,19 +83,8 @@ def find_probes_by_interface(interface_name: str) -> List[Dict]:
     Returns:
         List of matching probes
     """
-    config = get_config()
-    probes = config.get_all_probes()
-
-    normalized_query = normalize_interface_name(interface_name)
-    matches = []
-
-    for probe in probes:
-        probe_interface = normalize_interface_name(probe.get('interface', ''))
-
-        if probe_interface == normalized_query:
-            matches.append(probe)
-
-    return matches
+    index = _probe_index(get_config())
+    return index.select(index.by_interface.get(normalize_interface_name(interface_name), []))
 
 def find_probe_by_vid_pid(vendor_id: str, product_id: str, serial: Optional[str] = None) -> List[Dict]:
     """
@@ -61,25 +98,24 @@ def find_probe_by_vid_pid(vendor_id: str, product_id: str, serial: Optional[str]
     Returns:
         List of matching probes
     """
-    config = get_config()
-    probes = config.get_all_probes()
-
-    # Normalize IDs (remove common prefixes)
-    vendor_id = vendor_id.lower().replace('0x', '')
-    product_id = product_id.lower().replace('0x', '')
-
-    matches = []
-
-    for probe in probes:
-        probe_vid = probe.get('vendor_id', '').lower().replace('0x', '')
-        probe_pid = probe.get('product_id', '').lower().replace('0x', '')
-
-        if probe_vid == vendor_id and probe_pid == product_id:
-            # If serial is specified, check it
-            if serial is None or probe.get('serial', '') == serial:
-                matches.append(probe)
+    vid = parse_usb_id(vendor_id)
+    pid = parse_usb_id(product_id)
+    if vid is None or pid is None:
+        return []
+
+    index = _probe_index(get_config())
+
+    # Serials are (near) unique: start from the serial index and check
+    # VID/PID on that handful of probes instead.
+    if serial is not None:
+        positions = [
+            i for i in index.by_serial.get(serial, [])
+            if index.vendor_ids[i] == vid and index.product_ids[i] == pid
+        ]
+    else:
+        positions = index.by_vid_pid.get((vid, pid), [])
 
-    return matches
+    return index.select(positions)
 
 def find_probe_by_serial(serial: str) -> Optional[Dict]:
     """
@@ -91,14 +127,9 @@ def find_probe_by_serial(serial: str) -> Optional[Dict]:
     Returns:
         Matching probe or None
     """
-    config = get_config()
-    probes = config.get_all_probes()
-
-    for probe in probes:
-        if probe.get('serial', '') == serial:
-            return probe
-
-    return None
+    index = _probe_index(get_config())
+    positions = index.by_serial.get(serial)
+    return index.probes[positions[0]] if positions else None
 
 def find_probe_by_name(name: str) -> List[Dict]:
     """
@@ -110,18 +141,9 @@ def find_probe_by_name(name: str) -> List[Dict]:
     Returns:
         List of matching probes
     """
-    config = get_config()
-    probes = config.get_all_probes()
-
     name_lower = name.lower()
-    matches = []
-
-    for probe in probes:
-        probe_name = probe.get('name', '').lower()
-        if name_lower in probe_name:
-            matches.append(probe)
-
-    return matches
+    index = _probe_index(get_config())
+    return index.select(i for i in index.positions if name_lower in index.names[i])
 
 def search_probes(
     interface: Optional[str] = None,
@@ -155,47 +177,49 @@ def search_probes(
             "count": len(all_probes)
         }
 
-    # Start with all probes and filter down
-    candidates = all_probes.copy()
-
-    # Filter by interface
-    if interface:
-        normalized_interface = normalize_interface_name(interface)
-        candidates = [
-            p for p in candidates
-            if normalize_interface_name(p.get('interface', '')) == normalized_interface
-        ]
-
-    # Filter by VID
-    if vendor_id:
-        vid_normalized = vendor_id.lower().replace('0x', '')
-        candidates = [
-            p for p in candidates
-            if p.get('vendor_id', '').lower().replace('0x', '') == vid_normalized
-        ]
-
-    # Filter by PID
-    if product_id:
-        pid_normalized = product_id.lower().replace('0x', '')
-        candidates = [
-            p for p in candidates
-            if p.get('product_id', '').lower().replace('0x', '') == pid_normalized
-        ]
-
-    # Filter by serial
-    if serial:
-        candidates = [
-            p for p in candidates
-            if p.get('serial', '') == serial
-        ]
-
-    # Filter by name
+    # Start from the most selective index (serial > VID+PID > interface),
+    # then filter the remaining candidates down.
+    index = _probe_index(config)
+    vid = parse_usb_id(vendor_id) if vendor_id else None
+    pid = parse_usb_id(product_id) if product_id else None
+    normalized_interface = normalize_interface_name(interface) if interface else None
+
+    # Each remaining criterion becomes one position test; the starting
+    # index's own criterion is skipped. All tests run in a single pass.
+    checks = []
+    positions: Sequence[int]
+    if (vendor_id and vid is None) or (product_id and pid is None):
+        # An unparseable VID/PID matches nothing.
+        positions = []
+    elif serial:
+        positions = index.by_serial.get(serial, [])
+    elif vid is not None and pid is not None:
+        positions = index.by_vid_pid.get((vid, pid), [])
+        vid = pid = None
+    elif normalized_interface:
+        positions = index.by_interface.get(normalized_interface, [])
+        normalized_interface = None
+    else:
+        positions = index.positions
+
+    if normalized_interface:
+        interfaces = index.interfaces
+        checks.append(lambda i: interfaces[i] == normalized_interface)
+    if vid is not None:
+        vendor_ids = index.vendor_ids
+        checks.append(lambda i: vendor_ids[i] == vid)
+    if pid is not None:
+        product_ids = index.product_ids
+        checks.append(lambda i: product_ids[i] == pid)
     if name:
         name_lower = name.lower()
-        candidates = [
-            p for p in candidates
-            if name_lower in p.get('name', '').lower()
-        ]
+        names = index.names
+        checks.append(lambda i: name_lower in names[i])
+
+    if checks:
+        positions = [i for i in positions if all(check(i) for check in checks)]
+
+    candidates = index.select(positions)
 
     return {
         "query": {
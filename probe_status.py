@@ -4,35 +4,136 @@ Probe Status Reporter
 Reports connection status of all configured probes
 """
 import json
+import os
+import stat
 import subprocess
 import sys
 from pathlib import Path
 from config_loader import get_config
 
-def get_device_info(probe_id):
-    """Get device information from udev"""
-    dev_path = f"/dev/probes/probe_{probe_id}"
+PROBE_LINK_PREFIX = "probes/"
+UDEV_DATA_DIR = "/run/udev/data"
 
-    if not Path(dev_path).exists():
-        return None
 
+def _scan_all_devices():
+    """
+    Read the whole udev database once.
+
+    Returns:
+        dict: /dev/probes/... symlink path -> udev properties for every
+        device that has a probe symlink, or None if udevadm failed
+    """
     try:
-        # Query udev for device properties
         result = subprocess.run(
-            ["udevadm", "info", "--query=property", f"--name={dev_path}"],
+            ["udevadm", "info", "--export-db"],
             capture_output=True,
             text=True,
             timeout=5
         )
+    except Exception as e:
+        print(f"Error reading udev database: {e}", file=sys.stderr)
+        return None
 
-        if result.returncode != 0:
-            return None
+    if result.returncode != 0:
+        return None
 
+    devices = {}
+    # Records are blank-line separated; "S:" lines are symlinks relative to
+    # /dev and "E:" lines are properties.
+    for record in result.stdout.split("\n\n"):
+        if "S: " + PROBE_LINK_PREFIX not in record:
+            continue
+        links = []
         properties = {}
-        for line in result.stdout.splitlines():
-            if '=' in line:
-                key, value = line.split('=', 1)
+        for line in record.splitlines():
+            if line.startswith("S: "):
+                links.append(line[3:])
+            elif line.startswith("E: ") and '=' in line:
+                key, value = line[3:].split('=', 1)
                 properties[key] = value
+        for link in links:
+            if link.startswith(PROBE_LINK_PREFIX):
+                devices[f"/dev/{link}"] = properties
+    return devices
+
+
+def _read_udev_db(dev_path):
+    """
+    Read one device's properties straight from the udev database.
+
+    Returns:
+        dict of "E:" properties from /run/udev/data/<c|b><major>:<minor>,
+        or None if the device or its database entry cannot be read
+    """
+    try:
+        st = os.stat(dev_path)
+    except OSError:
+        return None
+    if stat.S_ISCHR(st.st_mode):
+        kind = "c"
+    elif stat.S_ISBLK(st.st_mode):
+        kind = "b"
+    else:
+        return None
+
+    db_path = f"{UDEV_DATA_DIR}/{kind}{os.major(st.st_rdev)}:{os.minor(st.st_rdev)}"
+    try:
+        with open(db_path, "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    properties = {}
+    for line in lines:
+        if line.startswith("E:") and '=' in line:
+            key, value = line[2:].split('=', 1)
+            properties[key] = value
+    return properties
+
+
+def _query_device_properties(dev_path):
+    """Query udev for one device's properties (None on failure)."""
+    result = subprocess.run(
+        ["udevadm", "info", "--query=property", f"--name={dev_path}"],
+        capture_output=True,
+        text=True,
+        timeout=5
+    )
+
+    if result.returncode != 0:
+        return None
+
+    properties = {}
+    for line in result.stdout.splitlines():
+        if '=' in line:
+            key, value = line.split('=', 1)
+            properties[key] = value
+    return properties
+
+
+def get_device_info(probe_id, devices=None):
+    """
+    Get device information from udev
+
+    Args:
+        probe_id: Probe ID
+        devices: Optional result of _scan_all_devices(); read from the udev
+            database (or queried via udevadm) per device if None
+    """
+    dev_path = f"/dev/probes/probe_{probe_id}"
+
+    if not Path(dev_path).exists():
+        return None
+
+    try:
+        properties = devices.get(dev_path) if devices is not None else None
+        if properties is None:
+            # Not in the snapshot (no scan, or plugged in since): ask directly.
+            properties = _read_udev_db(dev_path)
+        if properties is None:
+            properties = _query_device_properties(dev_path)
+        if properties is None:
+            return None
 
         # Extract serial number
         serial = properties.get('ID_SERIAL_SHORT', properties.get('ID_SERIAL', ''))
@@ -48,18 +149,22 @@ def get_device_info(probe_id):
         print(f"Error querying device {dev_path}: {e}", file=sys.stderr)
         return None
 
-def main():
+def collect_status():
+    """Build the status entry for every configured probe."""
     config = get_config()
     probes = config.get_all_probes()
 
     status_list = []
+    # Per-device database reads need no subprocess at all; without the
+    # database (e.g. in a container) fall back to one udevadm scan.
+    devices = None if os.path.isdir(UDEV_DATA_DIR) else _scan_all_devices()
 
     for probe in probes:
         probe_id = probe['id']
         name = probe['name']
         expected_serial = probe.get('serial', '')
 
-        device_info = get_device_info(probe_id)
+        device_info = get_device_info(probe_id, devices)
 
         if device_info:
             status = {
@@ -82,8 +187,11 @@ def main():
 
         status_list.append(status)
 
+    return status_list
+
+def main():
     # Output JSON
-    print(json.dumps(status_list, indent=2))
+    print(json.dumps(collect_status(), indent=2))
 
 if __name__ == '__main__':
     main()
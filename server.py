@@ -4,112 +4,368 @@ Debugger Station HTTP Server
 Provides REST API for firmware flashing and debugging
 """
 import http.server
-import socketserver
 import subprocess
 import json
+import logging
+import re
 import os
 import sys
-import cgi
-import io
 import fcntl
 import time
-from urllib.parse import urlparse
+import select
+import signal
+import threading
+import weakref
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
 from pathlib import Path
-from config_loader import get_config
+from typing import Tuple
+import docker_api
+from config_loader import Config, get_config
 from probe_finder import search_probes
-
-config = get_config()
-
-PORT = config.server_port
-UPLOAD_DIR = config.upload_dir
+from probe_status import collect_status
+from multipart_form import MAX_URLENCODED_BYTES, parse_form
+from file_watch import FileCloseWatcher
+from dispatch_daemon import (
+    DaemonUnavailable,
+    DispatcherDaemon,
+    kill_worker,
+    read_worker_pid,
+    split_exit_trailer,
+)
+
+try:
+    import orjson
+    _HAVE_ORJSON = True
+except ImportError:
+    _HAVE_ORJSON = False
+
+logger = logging.getLogger("probe_hub")
+
+# Listener settings are read once at startup; everything else calls
+# get_config() per request so edits to config.yml are picked up live.
+PORT = get_config().server_port
+UPLOAD_DIR = get_config().upload_dir
 UART_BAUD_MIN = 300
 UART_BAUD_MAX = 3_000_000
 UART_BAUD_DEFAULT = 115200
+# Characters escaped so pkill -f (POSIX ERE) matches stop patterns literally.
+_ERE_SPECIAL = re.compile(r"([.\[\]()*+?{}|^$\\])")
+DISPATCHER_SCRIPT = Path(__file__).parent / "debug_dispatcher.py"
+DISPATCH_TIMEOUT_SECONDS = 60
+LOCK_WATCH_MAX_WAIT_SECONDS = 1.0
+DOCKER_EXEC_TIMEOUT_SECONDS = 10
+# Only the tail of a runaway dispatcher log is returned to the client.
+DISPATCH_LOG_MAX_BYTES = 8 << 20
+
+# Serialized GET responses that depend only on config.yml:
+# key -> (config version, JSON bytes). Bounded because search keys come
+# from client queries.
+RESPONSE_CACHE_SIZE = 256
+_response_cache: "OrderedDict[Tuple, Tuple[Tuple[int, int], bytes]]" = OrderedDict()
+# Requests are served on worker threads; OrderedDict reordering is not atomic.
+_response_cache_lock = threading.Lock()
+
+def encode_json(data):
+    """Serialize a response body as compact UTF-8 JSON (orjson when installed)."""
+    if _HAVE_ORJSON:
+        try:
+            # NON_STR_KEYS: YAML can yield int keys; stringify them like json does.
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Anything else orjson rejects is left to the json module.
+            pass
+    return json.dumps(data, separators=(',', ':')).encode()
+
+def cached_json_response(key, config, build):
+    """Return JSON bytes for key, rebuilding via build() when config changed."""
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+        if cached is not None and cached[0] == config.version:
+            _response_cache.move_to_end(key)
+            return cached[1]
+
+    # Serialize outside the lock; concurrent misses just build twice.
+    body = encode_json(build())
+    with _response_cache_lock:
+        _response_cache[key] = (config.version, body)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+    return body
+
+def probes_response(config):
+    """Serialized /probes body for a loaded config."""
+    return cached_json_response(("probes",), config, lambda: {"probes": config.get_all_probes()})
+
+def targets_response(config):
+    """Serialized /targets body for a loaded config."""
+    return cached_json_response(("targets",), config, lambda: {"targets": config.get_targets_view()})
+
+# /status reflects USB hot-plug, so it is cached briefly rather than by
+# config version: (monotonic expiry, JSON bytes). The lock is held while
+# collecting, so concurrent requests share one udev scan.
+STATUS_CACHE_TTL_SECONDS = 2.0
+_status_cache = None
+_status_cache_lock = threading.Lock()
+
+def cached_status_response():
+    """Return /status JSON bytes, collecting at most once per TTL."""
+    global _status_cache
+    with _status_cache_lock:
+        if _status_cache is None or _status_cache[0] <= time.monotonic():
+            body = encode_json(collect_status())
+            _status_cache = (time.monotonic() + STATUS_CACHE_TTL_SECONDS, body)
+        return _status_cache[1]
+
+# Memoized validation results: config instance -> OrderedDict of
+# (target, probe_id, mode, transport) -> result. Weakly keyed, so a
+# superseded config and its memo are dropped together; bounded per config
+# because the keys come from client input.
+VALIDATION_CACHE_SIZE = 512
+_validation_cache: "weakref.WeakKeyDictionary[Config, OrderedDict[Tuple, Tuple]]" = (
+    weakref.WeakKeyDictionary()
+)
+_validation_cache_lock = threading.Lock()
+
+def _validate_dispatch_cached(config, target, probe_id, mode, transport):
+    """(resolved transport, None) or (None, error message), memoized per config instance."""
+    key = (target, probe_id, mode, transport)
+    with _validation_cache_lock:
+        memo = _validation_cache.get(config)
+        if memo is None:
+            memo = _validation_cache[config] = OrderedDict()
+        result = memo.get(key)
+        if result is not None:
+            memo.move_to_end(key)
+            return result
+
+    result = _validate_dispatch_uncached(config, target, probe_id, mode, transport)
+    with _validation_cache_lock:
+        memo[key] = result
+        while len(memo) > VALIDATION_CACHE_SIZE:
+            memo.popitem(last=False)
+    return result
+
+def _validate_dispatch_uncached(config, target, probe_id, mode, transport):
+    if not config.get_target(target):
+        return None, f"Unknown target: {target}"
+
+    probe = config.get_probe(probe_id)
+    if not probe:
+        return None, f"Unknown probe ID: {probe_id}"
+
+    if not config.is_probe_compatible(target, probe_id, mode=mode):
+        return None, f"Probe {probe_id} is not compatible with target {target} in mode={mode}"
+
+    interface = probe.get("interface", "")
+    try:
+        resolved_transport = config.resolve_transport(
+            target_name=target,
+            interface=interface,
+            requested_transport=transport,
+            mode=mode,
+        )
+        config.validate_probe_transport(
+            target_name=target,
+            interface=interface,
+            probe=probe,
+            requested_transport=transport,
+            resolved_transport=resolved_transport,
+            mode=mode,
+        )
+    except ValueError as e:
+        return None, str(e)
+    return resolved_transport, None
+
+def validate_dispatch(config, target, probe_id, mode, transport):
+    """
+    Check a dispatch request against the loaded config.
+
+    Results, including rejections, are memoized per config instance, so a
+    reloaded config.yml is validated afresh.
+
+    Returns:
+        Resolved transport name, or None if the target uses none
+
+    Raises:
+        ValueError: if the target, probe, mode or transport is not valid
+    """
+    resolved_transport, error = _validate_dispatch_cached(config, target, probe_id, mode, transport)
+    if error:
+        raise ValueError(error)
+    return resolved_transport
+
+# Started by main(); None (e.g. when imported) means every dispatch spawns.
+_dispatcher_daemon = None
+
+def _read_output(fd, deadline, cmd, timeout):
+    """
+    Read a dispatcher's output until EOF, keeping the last DISPATCH_LOG_MAX_BYTES.
+
+    Raises:
+        subprocess.TimeoutExpired: if EOF is not reached by deadline
+    """
+    buf = bytearray()
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        readable, _, _ = select.select([fd], [], [], remaining)
+        if not readable:
+            continue
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return buf
+        buf += chunk
+        if len(buf) > DISPATCH_LOG_MAX_BYTES:
+            del buf[:-DISPATCH_LOG_MAX_BYTES]
+
+def _spawn_dispatcher(args, timeout):
+    """Run debug_dispatcher.py in a fresh interpreter; returns (returncode, log text)."""
+    cmd = [sys.executable, str(DISPATCHER_SCRIPT), *args]
+    # Own process group, so a timeout also kills children such as the
+    # docker CLI; the lock monitor detaches with setsid() and survives.
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True
+    )
+    deadline = time.monotonic() + timeout
+    try:
+        buf = _read_output(proc.stdout.fileno(), deadline, cmd, timeout)
+        returncode = proc.wait(timeout=max(deadline - time.monotonic(), 0))
+    except BaseException:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.wait()
+        raise
+    finally:
+        proc.stdout.close()
+    return returncode, buf.decode("utf-8", "replace")
+
+def run_dispatcher(args, timeout=DISPATCH_TIMEOUT_SECONDS):
+    """
+    Run one dispatch and collect its merged stdout/stderr as raw bytes.
+
+    Goes through the pre-warmed dispatcher daemon when it is running, and
+    spawns debug_dispatcher.py otherwise.
+
+    Returns:
+        (returncode, log text)
+
+    Raises:
+        subprocess.TimeoutExpired: if the dispatcher runs past timeout (its
+            process group is killed)
+    """
+    if _dispatcher_daemon is not None:
+        try:
+            conn = _dispatcher_daemon.submit(args, timeout)
+        except DaemonUnavailable as e:
+            logger.warning("Dispatcher daemon unavailable (%s); spawning instead", e)
+        else:
+            deadline = time.monotonic() + timeout
+            with conn:
+                worker_pid = read_worker_pid(conn, deadline)
+                try:
+                    buf = _read_output(conn.fileno(), deadline, args, timeout)
+                except subprocess.TimeoutExpired:
+                    # The daemon kills timed-out workers too, unless it died.
+                    if worker_pid is not None:
+                        kill_worker(worker_pid)
+                    raise
+            returncode, log = split_exit_trailer(buf)
+            # Decoded straight from the read buffer, once, at the JSON boundary.
+            text = str(log, "utf-8", "replace")
+            if returncode is not None:
+                return returncode, text
+            if worker_pid is None and not text:
+                # The daemon died before forking a worker: nothing ran yet.
+                logger.warning("Dispatcher daemon exited before running the dispatch; spawning instead")
+                return _spawn_dispatcher(args, timeout)
+            return 1, text + "\n[ERROR] Dispatcher daemon exited before reporting the exit status\n"
+    return _spawn_dispatcher(args, timeout)
 
 class Handler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive: every response carries Content-Length.
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections each hold a server thread; drop them.
+    timeout = 60
+    # Buffer wfile so the status line, headers and body leave in one send;
+    # BaseHTTPRequestHandler flushes it after each request.
+    wbufsize = -1
+    # Set per POST; GET requests have no body to consume.
+    _body_consumed = True
+
     def log_message(self, format, *args):
-        """Override to log to stderr for journalctl compatibility"""
-        sys.stderr.write(f"[{self.log_date_time_string()}] {format % args}\n")
+        """Route the access log through the hub logger (stderr, for journalctl)"""
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "%s - - [%s] %s", self.address_string(), self.log_date_time_string(), format % args
+            )
 
     def do_GET(self):
-        parsed_path = urlparse(self.path).path.rstrip("/")
-        print(f"[DEBUG] GET {parsed_path}", file=sys.stderr)
-
-        if parsed_path == '/status':
-            self._handle_status()
-        elif parsed_path == '/probes':
-            self._handle_probes_list()
-        elif parsed_path.startswith('/probes/search'):
-            self._handle_probe_search()
-        elif parsed_path == '/targets':
-            self._handle_targets_list()
-        else:
-            self._send_error(404, "Not Found", {"path": self.path})
+        parsed = urlparse(self.path)
+        parsed_path = parsed.path.rstrip("/")
+        logger.debug("GET %s", parsed_path)
+
+        handler = self._GET_ROUTES.get(parsed_path)
+        if handler is not None:
+            handler(self)
+            return
+        for prefix, handler in self._GET_PREFIX_ROUTES:
+            if parsed_path.startswith(prefix):
+                handler(self, parsed.query)
+                return
+        self._send_error(404, "Not Found", {"path": self.path})
 
     def do_POST(self):
+        # Bodies are only read by Content-Length; a chunked body is never
+        # drained, so the connection must not be reused after it.
+        self._body_consumed = (
+            'Transfer-Encoding' not in self.headers
+            and self.headers.get('Content-Length', '0').strip() == '0'
+        )
         parsed_path = urlparse(self.path).path.rstrip("/")
-        print(f"[DEBUG] POST {parsed_path}", file=sys.stderr)
+        logger.debug("POST %s", parsed_path)
 
-        if parsed_path == '/dispatch':
-            self._handle_dispatch()
-        elif parsed_path == '/session/stop':
-            self._handle_session_stop()
+        handler = self._POST_ROUTES.get(parsed_path)
+        if handler is not None:
+            handler(self)
         else:
             self._send_error(404, "Not Found")
 
     def _handle_status(self):
         """Get status of all probes"""
         try:
-            script_path = Path(__file__).parent / "probe_status.py"
-            out = subprocess.check_output([sys.executable, str(script_path)])
-            self._send_json(200, json.loads(out))
+            self._send_json_bytes(200, cached_status_response())
         except Exception as e:
-            print(f"[ERROR] probe_status failed: {e}", file=sys.stderr)
+            logger.error("probe_status failed: %s", e)
             self._send_json(500, {"error": str(e)})
 
     def _handle_probes_list(self):
         """List all configured probes"""
         try:
-            probes = config.get_all_probes()
-            self._send_json(200, {"probes": probes})
+            config = get_config()
+            self._send_json_bytes(200, probes_response(config))
         except Exception as e:
-            print(f"[ERROR] Failed to list probes: {e}", file=sys.stderr)
+            logger.error("Failed to list probes: %s", e)
             self._send_json(500, {"error": str(e)})
 
     def _handle_targets_list(self):
         """List all supported targets"""
         try:
-            targets = {}
-            for name, target_config in config.get_all_targets().items():
-                compatible_probes_by_mode = config.get_compatible_probes_by_mode(name)
-                compatible_probes = config.get_compatible_probes(name)
-                transports = {}
-                for interface in compatible_probes:
-                    transports[interface] = {
-                        "default": config.get_default_transport(name, interface),
-                        "allowed": config.get_allowed_transports(name, interface),
-                    }
-                targets[name] = {
-                    "description": target_config.get("description", ""),
-                    "compatible_probes": compatible_probes,
-                    "compatible_interfaces": compatible_probes,
-                    "compatible_probes_by_mode": compatible_probes_by_mode,
-                    "container": target_config.get("container", ""),
-                    "transports": transports,
-                }
-            self._send_json(200, {"targets": targets})
+            config = get_config()
+            self._send_json_bytes(200, targets_response(config))
         except Exception as e:
-            print(f"[ERROR] Failed to list targets: {e}", file=sys.stderr)
+            logger.error("Failed to list targets: %s", e)
             self._send_json(500, {"error": str(e)})
 
-    def _handle_probe_search(self):
+    def _handle_probe_search(self, query):
         """Search for probes by various criteria"""
         try:
-            from urllib.parse import parse_qs
-
-            # Parse query parameters
-            parsed = urlparse(self.path)
-            query_params = parse_qs(parsed.query)
+            # Parse query parameters (do_GET already split off the query string)
+            query_params = parse_qs(query)
 
             # Extract search criteria (take first value from lists)
             interface = query_params.get('interface', [None])[0]
@@ -119,34 +375,43 @@ class Handler(http.server.BaseHTTPRequestHandler):
             name = query_params.get('name', [None])[0]
 
             # Perform search
-            results = search_probes(
-                interface=interface,
-                vendor_id=vendor_id,
-                product_id=product_id,
-                serial=serial,
-                name=name
+            body = cached_json_response(
+                ("probes/search", interface, vendor_id, product_id, serial, name),
+                get_config(),
+                lambda: search_probes(
+                    interface=interface,
+                    vendor_id=vendor_id,
+                    product_id=product_id,
+                    serial=serial,
+                    name=name
+                ),
             )
 
-            self._send_json(200, results)
+            self._send_json_bytes(200, body)
 
         except Exception as e:
-            print(f"[ERROR] Probe search failed: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc(file=sys.stderr)
+            logger.exception("Probe search failed: %s", e)
             self._send_json(500, {"error": str(e)})
 
     def _handle_dispatch(self):
         """Handle firmware dispatch request"""
+        form = None
         try:
             content_type = self.headers.get('Content-Type')
             if not content_type:
                 raise ValueError("Content-Type header missing")
 
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
+            # Refuse oversized bodies before reading any of them (the
+            # connection is then closed).
+            max_upload = get_config().max_upload_bytes
+            if int(self.headers.get('Content-Length', 0)) > max_upload:
+                self._send_error(413, f"Payload too large (limit {max_upload} bytes)")
+                return
 
-            # Parse multipart form data
-            form_data, file_data, filename = self._parse_multipart(content_type, body)
+            # Parse form data; an uploaded file streams to UPLOAD_DIR.
+            form = self._parse_form(content_type)
+            form_data = form.fields
+            filename = form.filename or "firmware.bin"
 
             target = form_data.get("target")
             probe_id = form_data.get("probe")
@@ -164,15 +429,7 @@ class Handler(http.server.BaseHTTPRequestHandler):
             probe_id = int(probe_id)
 
             # Validate configuration
-            if not config.get_target(target):
-                raise ValueError(f"Unknown target: {target}")
-
-            probe = config.get_probe(probe_id)
-            if not probe:
-                raise ValueError(f"Unknown probe ID: {probe_id}")
-
-            if not config.is_probe_compatible(target, probe_id, mode=mode):
-                raise ValueError(f"Probe {probe_id} is not compatible with target {target} in mode={mode}")
+            resolved_transport = validate_dispatch(get_config(), target, probe_id, mode, transport)
 
             uart_baud = UART_BAUD_DEFAULT
             if mode == "print" and baud_raw:
@@ -185,38 +442,15 @@ class Handler(http.server.BaseHTTPRequestHandler):
                         f"Invalid baud: must be between {UART_BAUD_MIN} and {UART_BAUD_MAX}"
                     )
 
-            interface = probe.get("interface", "")
-            try:
-                resolved_transport = config.resolve_transport(
-                    target_name=target,
-                    interface=interface,
-                    requested_transport=transport,
-                    mode=mode,
-                )
-                config.validate_probe_transport(
-                    target_name=target,
-                    interface=interface,
-                    probe=probe,
-                    requested_transport=transport,
-                    resolved_transport=resolved_transport,
-                    mode=mode,
-                )
-            except ValueError as e:
-                raise ValueError(str(e))
-
             # Save firmware file if provided
             firmware_path = None
-            if file_data and mode == "flash":
+            if form.file_size and mode == "flash":
                 firmware_path = os.path.join(UPLOAD_DIR, filename)
-                with open(firmware_path, 'wb') as f:
-                    f.write(file_data)
-                print(f"[DEBUG] Saved firmware: {firmware_path}", file=sys.stderr)
+                form.save_file(firmware_path)
+                logger.debug("Saved firmware: %s", firmware_path)
 
             # Execute dispatcher
-            script_path = Path(__file__).parent / "debug_dispatcher.py"
-            cmd = [
-                sys.executable,
-                str(script_path),
+            args = [
                 target,
                 str(probe_id),
                 mode,
@@ -225,49 +459,82 @@ class Handler(http.server.BaseHTTPRequestHandler):
                 str(uart_baud),
             ]
 
-            print(f"[DEBUG] Executing: {' '.join(cmd)}", file=sys.stderr)
-            res = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Dispatching: %s", " ".join(args))
+            returncode, log = run_dispatcher(args)
 
             resp = {
-                "status": "ok" if res.returncode == 0 else "error",
-                "log": res.stdout + res.stderr
+                "status": "ok" if returncode == 0 else "error",
+                "log": log
             }
-            self._send_json(200 if res.returncode == 0 else 500, resp)
+            self._send_json(200 if returncode == 0 else 500, resp)
 
         except ValueError as e:
             self._send_json(400, {"status": "error", "error": str(e)})
         except Exception as e:
-            print(f"[ERROR] Dispatch failed: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc(file=sys.stderr)
+            logger.exception("Dispatch failed: %s", e)
             self._send_json(500, {"status": "error", "error": str(e)})
+        finally:
+            if form is not None:
+                form.discard()
 
     def _list_probe_containers(self, probe_id: int):
-        """List candidate container names for a probe suffix and config-defined services."""
-        names = set()
+        """
+        List candidate containers for a probe suffix and config-defined services.
+
+        Returns:
+            Sorted (container name, running) pairs
+        """
+        running = {}
         suffix = f"-p{probe_id}"
 
-        # Prefer real container names from Docker.
-        docker_ps = subprocess.run(
-            ["docker", "ps", "-a", "--format", "{{.Names}}"],
-            capture_output=True,
-            text=True,
-        )
-        if docker_ps.returncode == 0:
-            for line in docker_ps.stdout.splitlines():
-                name = line.strip()
+        # One listing returns both names and states (the name filter is a regex).
+        listed = True
+        try:
+            listing = docker_api.list_containers(f"{suffix}$")
+        except docker_api.DockerUnavailable:
+            listing = self._docker_ps_states(f"{suffix}$")
+            listed = listing is not None
+        if listed:
+            for name, state in listing.items():
                 if name.endswith(suffix):
-                    names.add(name)
+                    running[name] = state
 
-        # Add config-derived names as fallback.
-        for container in config.get_all_containers().values():
+        # Add config-derived names as fallback. Docker did not list them, so
+        # they only need checking one by one if the listing itself failed.
+        for container in get_config().get_all_containers().values():
             base = container.get("name")
             if base:
-                names.add(f"{base}{suffix}")
+                name = f"{base}{suffix}"
+                if name not in running:
+                    running[name] = not listed and self._is_container_running(name)
 
-        return sorted(names)
+        return sorted(running.items())
+
+    def _docker_ps_states(self, name_regex: str):
+        """CLI fallback for docker_api.list_containers(); None if docker failed."""
+        docker_ps = subprocess.run(
+            [
+                "docker", "ps", "-a",
+                "--filter", f"name={name_regex}",
+                "--format", "{{.Names}}\t{{.State}}",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if docker_ps.returncode != 0:
+            return None
+        states = {}
+        for line in docker_ps.stdout.splitlines():
+            name, _, state = line.strip().partition("\t")
+            states[name] = state == "running"
+        return states
 
     def _is_container_running(self, container_name: str) -> bool:
+        try:
+            return docker_api.container_running(container_name)
+        except docker_api.DockerUnavailable:
+            pass
         result = subprocess.run(
             ["docker", "inspect", "-f", "{{.State.Running}}", container_name],
             capture_output=True,
@@ -275,54 +542,96 @@ class Handler(http.server.BaseHTTPRequestHandler):
         )
         return result.returncode == 0 and result.stdout.strip().lower() == "true"
 
-    def _pkill_pattern(self, container_name: str, pattern: str) -> None:
+    def _pkill_patterns(self, container_name: str, patterns, port_patterns=()) -> None:
+        """
+        Kill processes matching any of the literal patterns with a single exec.
+
+        port_patterns each end in a port number and must not match a longer
+        port (3331 vs 33310), as in the dispatcher's cleanup.
+        """
+        alternatives = [_ERE_SPECIAL.sub(r"\\\1", pattern) for pattern in patterns]
+        if port_patterns:
+            alternatives.append(
+                "(%s)([^0-9]|$)"
+                % "|".join(_ERE_SPECIAL.sub(r"\\\1", pattern) for pattern in port_patterns)
+            )
+        regex = "|".join(alternatives)
+        argv = ["pkill", "-f", "--", regex]
+        try:
+            docker_api.exec_run(container_name, argv, timeout=DOCKER_EXEC_TIMEOUT_SECONDS)
+            return
+        except docker_api.DockerUnavailable:
+            pass
+        except subprocess.TimeoutExpired:
+            logger.warning("pkill in %s timed out", container_name)
+            return
         subprocess.run(
-            ["docker", "exec", container_name, "pkill", "-f", "--", pattern],
+            ["docker", "exec", container_name] + argv,
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
         )
 
     def _stop_probe_processes(self, container_name: str, probe_id: int, kind: str) -> None:
+        config = get_config()
         gdb_port = config.gdb_base_port + probe_id
         rtt_port = config.rtt_base_port + probe_id
 
+        patterns = []
+        port_patterns = []
         if kind in ("debug", "all"):
-            for pattern in [
+            port_patterns += [
                 f"gdb_port {gdb_port}",
                 f"-port {gdb_port}",
                 f":{gdb_port}",
+            ]
+            patterns += [
                 "JLinkGDBServer",
                 "openocd",
-            ]:
-                self._pkill_pattern(container_name, pattern)
+            ]
 
         if kind in ("print", "all"):
-            for pattern in [
+            port_patterns += [
                 f"RTTTelnetPort {rtt_port}",
                 f"TCP-LISTEN:{rtt_port}",
                 f":{rtt_port}",
+            ]
+            patterns += [
                 f"Starting print server (probe {probe_id})",
                 "JLinkRTTClient",
                 "wlink",
                 "socat",
-            ]:
-                self._pkill_pattern(container_name, pattern)
+            ]
+
+        if not patterns and not port_patterns:
+            return
+
+        self._pkill_patterns(container_name, patterns, port_patterns)
 
     def _wait_lock_release(self, probe_id: int, timeout_seconds: float = 5.0, poll_seconds: float = 0.2) -> bool:
         lock_path = Path(f"/var/lock/probe_{probe_id}.lock")
         lock_path.parent.mkdir(parents=True, exist_ok=True)
-        deadline = time.time() + timeout_seconds
+        deadline = time.monotonic() + timeout_seconds
 
         with open(lock_path, "w") as lock_file:
-            while time.time() < deadline:
-                try:
-                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    fcntl.flock(lock_file, fcntl.LOCK_UN)
-                    return True
-                except BlockingIOError:
-                    time.sleep(poll_seconds)
-
-        return False
+            # Watch before the first attempt so a release in between is not
+            # missed. Closing the holder's fd releases the flock and fires
+            # an inotify close event; the cap covers an explicit LOCK_UN.
+            watcher = FileCloseWatcher(str(lock_path))
+            max_wait = LOCK_WATCH_MAX_WAIT_SECONDS if watcher.available else poll_seconds
+            try:
+                while True:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                        return True
+                    except BlockingIOError:
+                        pass
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    watcher.wait(min(remaining, max_wait))
+            finally:
+                watcher.close()
 
     def _handle_session_stop(self):
         """Stop active debug/print session for a probe and wait lock release."""
@@ -332,9 +641,12 @@ class Handler(http.server.BaseHTTPRequestHandler):
             if not content_type:
                 raise ValueError("Content-Type header missing")
 
-            content_length = int(self.headers.get("Content-Length", 0))
-            body = self.rfile.read(content_length)
-            form_data, _, _ = self._parse_multipart(content_type, body)
+            if content_type.split(";", 1)[0].strip().lower() == "application/json":
+                form_data = self._parse_json_fields()
+            else:
+                form = self._parse_form(content_type)
+                form.discard()
+                form_data = form.fields
 
             probe_raw = form_data.get("probe")
             if not probe_raw:
@@ -345,21 +657,21 @@ class Handler(http.server.BaseHTTPRequestHandler):
                 raise ValueError("Invalid kind. Must be one of: debug, print, all")
 
             probe_id = int(probe_raw)
-            probe = config.get_probe(probe_id)
+            probe = get_config().get_probe(probe_id)
             if not probe:
                 raise ValueError(f"Unknown probe ID: {probe_id}")
 
             logs.append(f"Target probe: {probe['name']} (ID: {probe_id})")
             logs.append(f"Requested kind: {kind}")
 
-            container_names = self._list_probe_containers(probe_id)
-            if not container_names:
+            containers = self._list_probe_containers(probe_id)
+            if not containers:
                 logs.append("No candidate containers found for this probe.")
             else:
-                logs.append("Candidate containers: " + ", ".join(container_names))
+                logs.append("Candidate containers: " + ", ".join(name for name, _ in containers))
 
-            for container_name in container_names:
-                if not self._is_container_running(container_name):
+            for container_name, running in containers:
+                if not running:
                     logs.append(f"[SKIP] {container_name}: not running")
                     continue
 
@@ -375,49 +687,55 @@ class Handler(http.server.BaseHTTPRequestHandler):
                 self._send_json(500, {"status": "error", "log": "\n".join(logs)})
 
         except Exception as e:
-            print(f"[ERROR] Session stop failed: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc(file=sys.stderr)
+            logger.exception("Session stop failed: %s", e)
             logs.append(f"Error: {e}")
             self._send_json(500, {"status": "error", "log": "\n".join(logs), "error": str(e)})
 
-    def _parse_multipart(self, content_type, body):
-        """Parse multipart form data"""
-        # Create file-like object from body
-        environ = {
-            'REQUEST_METHOD': 'POST',
-            'CONTENT_TYPE': content_type,
-            'CONTENT_LENGTH': len(body)
-        }
-
-        form = cgi.FieldStorage(
-            fp=io.BytesIO(body),
-            environ=environ,
-            keep_blank_values=True
-        )
-
-        form_data = {}
-        file_data = None
-        filename = "firmware.bin"
-
-        # Extract form fields
-        for key in form.keys():
-            item = form[key]
-            item_filename = getattr(item, "filename", None)
-            if item_filename:  # File upload
-                filename = os.path.basename(item_filename)
-                file_data = item.file.read()
-            else:  # Regular form field
-                form_data[key] = item.value
-
-        return form_data, file_data, filename
+    def _parse_form(self, content_type):
+        """Parse a multipart (streamed in chunks) or urlencoded request body"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        form = parse_form(self.rfile, content_type, content_length, UPLOAD_DIR)
+        self._body_consumed = 'Transfer-Encoding' not in self.headers
+        return form
+
+    def _parse_json_fields(self):
+        """Parse a small JSON object body into form-style string fields"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length > MAX_URLENCODED_BYTES:
+            raise ValueError(f"JSON body too large (limit {MAX_URLENCODED_BYTES} bytes)")
+        body = self.rfile.read(content_length) if content_length > 0 else b""
+        self._body_consumed = 'Transfer-Encoding' not in self.headers
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise ValueError("Invalid JSON body")
+        if not isinstance(data, dict):
+            raise ValueError("JSON body must be an object")
+
+        fields = {}
+        for key, value in data.items():
+            if isinstance(value, bool) or not isinstance(value, (str, int)):
+                raise ValueError(f"Invalid JSON field {key!r}: must be a string or integer")
+            fields[key] = str(value)
+        return fields
 
     def _send_json(self, status_code, data):
         """Send JSON response"""
+        self._send_json_bytes(status_code, encode_json(data))
+
+    def _send_json_bytes(self, status_code, body):
+        """Send an already-serialized JSON response"""
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if not self._body_consumed:
+            # An unread request body would be parsed as the next request.
+            self.send_header('Connection', 'close')
+        elif not self.close_connection and self.request_version == 'HTTP/1.0':
+            # HTTP/1.0 clients only keep the socket open when told to.
+            self.send_header('Connection', 'keep-alive')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
 
     def _send_error(self, status_code, message, extra=None):
         """Send error response"""
@@ -426,14 +744,72 @@ class Handler(http.server.BaseHTTPRequestHandler):
             error_data.update(extra)
         self._send_json(status_code, error_data)
 
+    # Route tables (path with trailing "/" stripped -> handler), built once
+    # with the class. Prefix routes also receive the query string.
+    _GET_ROUTES = {
+        '/status': _handle_status,
+        '/probes': _handle_probes_list,
+        '/targets': _handle_targets_list,
+    }
+    _GET_PREFIX_ROUTES = (
+        ('/probes/search', _handle_probe_search),
+    )
+    _POST_ROUTES = {
+        '/dispatch': _handle_dispatch,
+        '/session/stop': _handle_session_stop,
+    }
+
+class HubHTTPServer(http.server.ThreadingHTTPServer):
+    """
+    One thread per connection so a long /dispatch does not stall /status
+    or /probes; daemon threads don't block shutdown.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+    # Listen backlog: connections wait here while the accept loop spawns
+    # handler threads; socketserver's default of 5 refuses small bursts.
+    request_queue_size = 64
+
+def setup_logging():
+    """Log to stderr (journald) at LOG_LEVEL, default INFO; DEBUG adds per-request lines."""
+    level_name = os.environ.get("LOG_LEVEL", "INFO").upper()
+    level = logging.getLevelName(level_name)
+    # Keep the historical "[WARN]" prefix.
+    logging.addLevelName(logging.WARNING, "WARN")
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=level if isinstance(level, int) else logging.INFO,
+        format="[%(levelname)s] %(message)s",
+    )
+    if not isinstance(level, int):
+        logger.warning("Unknown LOG_LEVEL %r; using INFO", level_name)
+
 def main():
+    setup_logging()
     os.makedirs(UPLOAD_DIR, exist_ok=True)
-    socketserver.TCPServer.allow_reuse_address = True
 
-    with socketserver.TCPServer(("0.0.0.0", PORT), Handler) as httpd:
-        print(f"Debugger Station server listening on 0.0.0.0:{PORT}", file=sys.stderr)
-        print(f"Upload directory: {UPLOAD_DIR}", file=sys.stderr)
-        httpd.serve_forever()
+    # Serialize the config-derived responses before accepting clients, so
+    # the first requests are cache hits. A later config edit rebuilds them.
+    config = get_config()
+    probes_response(config)
+    targets_response(config)
+
+    global _dispatcher_daemon
+    daemon = DispatcherDaemon()
+    try:
+        daemon.start()
+        _dispatcher_daemon = daemon
+    except Exception as e:
+        logger.warning("Dispatcher daemon not started (%s); dispatches will spawn", e)
+
+    try:
+        with HubHTTPServer(("0.0.0.0", PORT), Handler) as httpd:
+            logger.info("Debugger Station server listening on 0.0.0.0:%d", PORT)
+            logger.info("Upload directory: %s", UPLOAD_DIR)
+            httpd.serve_forever()
+    finally:
+        _dispatcher_daemon = None
+        daemon.close()
 
 if __name__ == '__main__':
     main()
@@ -40,10 +40,14 @@ python3 generate_udev_rules.py
 echo ""
 echo "Installing udev rules..."
 if [ -f "99-debug-probe-hub.rules" ]; then
-    sudo cp 99-debug-probe-hub.rules /etc/udev/rules.d/
-    sudo udevadm control --reload-rules
-    sudo udevadm trigger
-    echo "udev rules installed successfully"
+    if cmp -s 99-debug-probe-hub.rules /etc/udev/rules.d/99-debug-probe-hub.rules; then
+        echo "udev rules already installed and unchanged"
+    else
+        sudo cp 99-debug-probe-hub.rules /etc/udev/rules.d/
+        sudo udevadm control --reload-rules
+        sudo udevadm trigger
+        echo "udev rules installed successfully"
+    fi
 else
     echo "ERROR: Failed to generate udev rules"
     exit 1
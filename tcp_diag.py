@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+TCP socket state via netlink sock_diag
+Reads the kernel socket table without spawning `ss`, and waits on
+TCP socket-destroy notifications so callers can block instead of polling.
+/proc/net/tcp{,6} is read directly where netlink is unavailable.
+"""
+import re
+import select
+import socket
+import struct
+import time
+from functools import lru_cache
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+TCP_ESTABLISHED = 1
+
+# Multicast groups (1-based) for TCP socket-destroy notifications.
+SKNLGRP_INET_TCP_DESTROY = 1
+SKNLGRP_INET6_TCP_DESTROY = 3
+
+_NLMSGHDR = struct.Struct("=LHHLL")
+# inet_diag_req_v2: family, protocol, ext, pad, states, then a zeroed
+# 48-byte inet_diag_sockid (ports, addresses, interface, cookie).
+_INET_DIAG_REQ_V2 = struct.Struct("=BBBxL48x")
+# inet_diag_msg prefix: family, state, timer, retrans, sport, dport.
+_INET_DIAG_MSG_PREFIX = struct.Struct("=BBBB")
+_PORT = struct.Struct(">H")
+_RECV_BUFSIZE = 65536
+PROC_NET_TCP_PATHS = ("/proc/net/tcp", "/proc/net/tcp6")
+
+
+def _iter_messages(data):
+    """Yield (type, payload) for each netlink message in a datagram."""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, _flags, _seq, _pid = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        yield msg_type, data[offset + _NLMSGHDR.size:offset + length]
+        offset += (length + 3) & ~3
+
+
+def _parse_inet_diag_msg(payload):
+    """Return (state, sport) from an inet_diag_msg payload."""
+    _family, state, _timer, _retrans = _INET_DIAG_MSG_PREFIX.unpack_from(payload, 0)
+    sport, = _PORT.unpack_from(payload, _INET_DIAG_MSG_PREFIX.size)
+    return state, sport
+
+
+def _dump_family(sock, family, states, seq):
+    request = _INET_DIAG_REQ_V2.pack(family, socket.IPPROTO_TCP, 0, states)
+    header = _NLMSGHDR.pack(
+        _NLMSGHDR.size + len(request),
+        SOCK_DIAG_BY_FAMILY,
+        NLM_F_REQUEST | NLM_F_DUMP,
+        seq,
+        0,
+    )
+    sock.send(header + request)
+
+    while True:
+        data = sock.recv(_RECV_BUFSIZE)
+        if not data:
+            return
+        for msg_type, payload in _iter_messages(data):
+            if msg_type == NLMSG_DONE:
+                return
+            if msg_type == NLMSG_ERROR:
+                errno, = struct.unpack_from("=i", payload, 0)
+                if errno:
+                    raise OSError(-errno, "sock_diag dump failed")
+                return
+            if msg_type == SOCK_DIAG_BY_FAMILY:
+                yield _parse_inet_diag_msg(payload)
+
+
+def count_established(port):
+    """
+    Count ESTABLISHED TCP sockets whose local port is `port`.
+
+    Equivalent to `ss -H -tan state established sport = :port`.
+
+    Raises:
+        OSError: if netlink sock_diag is unavailable
+    """
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG) as sock:
+        sock.settimeout(2)
+        count = 0
+        for seq, family in enumerate((socket.AF_INET, socket.AF_INET6), start=1):
+            for _state, sport in _dump_family(sock, family, 1 << TCP_ESTABLISHED, seq):
+                if sport == port:
+                    count += 1
+        return count
+
+
+@lru_cache(maxsize=None)
+def _procfs_established_regex(port):
+    # Row layout: "sl: local_ip:PORT remote_ip:PORT st ...", hex fields, st 01 = ESTABLISHED.
+    return re.compile(
+        rb"^\s*\d+:\s+[0-9A-F]+:%04X\s+[0-9A-F]+:[0-9A-F]+\s+01\s" % port,
+        re.M,
+    )
+
+
+def count_established_procfs(port):
+    """
+    Count ESTABLISHED TCP sockets whose local port is `port` from procfs.
+
+    Raises:
+        OSError: if neither /proc/net/tcp nor /proc/net/tcp6 is readable
+    """
+    pattern = _procfs_established_regex(port)
+    count = 0
+    read_any = False
+    for path in PROC_NET_TCP_PATHS:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            # tcp6 is absent on kernels without IPv6.
+            continue
+        read_any = True
+        count += len(pattern.findall(data))
+    if not read_any:
+        raise OSError("/proc/net/tcp is not readable")
+    return count
+
+
+class TcpDestroyWatcher:
+    """
+    Block until a TCP socket bound to `port` is destroyed.
+
+    Subscribing to the destroy groups needs CAP_NET_ADMIN; without it the
+    watcher degrades to a plain sleep so callers keep a single code path.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.sock = None
+        groups = (1 << (SKNLGRP_INET_TCP_DESTROY - 1)) | (1 << (SKNLGRP_INET6_TCP_DESTROY - 1))
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+        except OSError:
+            return
+        try:
+            sock.bind((0, groups))
+        except OSError:
+            sock.close()
+            return
+        sock.setblocking(False)
+        self.sock = sock
+
+    @property
+    def available(self):
+        return self.sock is not None
+
+    def wait(self, timeout):
+        """
+        Wait up to `timeout` seconds for a destroy event on the port.
+
+        Returns:
+            bool: True if an event for the port arrived, False on timeout
+        """
+        if self.sock is None:
+            time.sleep(timeout)
+            return False
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.sock], [], [], remaining)
+            if not readable:
+                return False
+            try:
+                data = self.sock.recv(_RECV_BUFSIZE)
+            except BlockingIOError:
+                continue
+            except OSError:
+                # ENOBUFS on overrun: events were dropped, so report one.
+                return True
+            for msg_type, payload in _iter_messages(data):
+                if msg_type != SOCK_DIAG_BY_FAMILY:
+                    continue
+                _state, sport = _parse_inet_diag_msg(payload)
+                if sport == self.port:
+                    return True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
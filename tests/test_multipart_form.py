@@ -0,0 +1,163 @@
+import io
+import os
+
+import pytest
+
+import multipart_form
+from multipart_form import (
+    CHUNK_SIZE,
+    MAX_FIELD_BYTES,
+    MAX_HEADER_BYTES,
+    UPLOAD_FILE_MODE,
+    parse_form,
+)
+
+BOUNDARY = "XyZ-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def field_part(name, value):
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"\r\n'
+        "\r\n"
+    ).encode() + value + b"\r\n"
+
+
+def file_part(name, filename, data):
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n"
+        "\r\n"
+    ).encode() + data + b"\r\n"
+
+
+def closing():
+    return f"--{BOUNDARY}--\r\n".encode()
+
+
+def parse(body, upload_dir, content_type=CONTENT_TYPE):
+    return parse_form(io.BytesIO(body), content_type, len(body), str(upload_dir))
+
+
+def read_upload(form):
+    with open(form.file_path, "rb") as f:
+        return f.read()
+
+
+def test_fields_and_file(tmp_path):
+    body = (
+        field_part("target", b"nrf52840")
+        + field_part("probe", b"1")
+        + file_part("file", "fw.bin", b"\x00\x01firmware")
+        + closing()
+    )
+    form = parse(body, tmp_path)
+    try:
+        assert form.fields == {"target": "nrf52840", "probe": "1"}
+        assert form.filename == "fw.bin"
+        assert form.file_size == 10
+        assert read_upload(form) == b"\x00\x01firmware"
+    finally:
+        form.discard()
+
+
+@pytest.mark.parametrize("offset", range(-len(BOUNDARY) - 8, 8))
+def test_boundary_split_across_reads(tmp_path, offset):
+    head = file_part("file", "fw.bin", b"")[:-2]
+    # Place the closing delimiter so it straddles the first CHUNK_SIZE read.
+    data = bytes(i % 251 for i in range(CHUNK_SIZE - len(head) + offset))
+    body = head + data + b"\r\n" + closing()
+    form = parse(body, tmp_path)
+    try:
+        assert read_upload(form) == data
+        assert form.file_size == len(data)
+    finally:
+        form.discard()
+
+
+def test_crlf_and_boundary_lookalikes_inside_file(tmp_path):
+    data = (
+        b"line1\r\nline2\r\n\r\n"
+        + f"x--{BOUNDARY}".encode()  # not preceded by CRLF: not a delimiter
+        + b"\r\n--" + BOUNDARY[:-1].encode() + b"\r\n"  # truncated boundary
+        + b"\r\n"
+    )
+    body = file_part("file", "fw.hex", data) + closing()
+    form = parse(body, tmp_path)
+    try:
+        assert read_upload(form) == data
+    finally:
+        form.discard()
+
+
+def test_missing_closing_delimiter(tmp_path):
+    body = field_part("probe", b"1") + file_part("file", "fw.bin", b"data")
+    with pytest.raises(ValueError, match="Truncated"):
+        parse(body[:-2], tmp_path)
+    # The partial upload is removed.
+    assert os.listdir(tmp_path) == []
+
+
+def test_preamble_and_epilogue(tmp_path):
+    body = (
+        b"This is the preamble.\r\n"
+        + field_part("mode", b"flash")
+        + closing()
+        + b"This is the epilogue, ignored.\r\n"
+    )
+    stream = io.BytesIO(body)
+    form = parse_form(stream, CONTENT_TYPE, len(body), str(tmp_path))
+    assert form.fields == {"mode": "flash"}
+    # The whole body is consumed, so a keep-alive connection stays in sync.
+    assert stream.read() == b""
+
+
+def test_oversized_part_headers(tmp_path):
+    body = (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="x"\r\n'
+        f"X-Padding: {'a' * (MAX_HEADER_BYTES + 1)}\r\n"
+        "\r\n"
+    ).encode() + b"v\r\n" + closing()
+    with pytest.raises(ValueError, match="headers too large"):
+        parse(body, tmp_path)
+
+
+def test_oversized_text_field(tmp_path):
+    body = field_part("target", b"a" * (MAX_FIELD_BYTES + 1)) + closing()
+    with pytest.raises(ValueError, match="too large"):
+        parse(body, tmp_path)
+
+
+def test_upload_mode_follows_umask(tmp_path):
+    body = file_part("file", "fw.bin", b"data") + closing()
+    form = parse(body, tmp_path)
+    try:
+        assert os.stat(form.file_path).st_mode & 0o777 == UPLOAD_FILE_MODE
+    finally:
+        form.discard()
+
+
+def test_missing_boundary(tmp_path):
+    with pytest.raises(ValueError, match="boundary"):
+        parse(closing(), tmp_path, content_type="multipart/form-data")
+
+
+def test_urlencoded(tmp_path):
+    body = b"probe=1&kind=print&target=a%20b&empty="
+    form = parse(body, tmp_path, content_type="application/x-www-form-urlencoded; charset=utf-8")
+    assert form.fields == {"probe": "1", "kind": "print", "target": "a b", "empty": ""}
+    assert form.file_path is None
+
+
+def test_urlencoded_too_large(tmp_path):
+    body = b"a=" + b"x" * multipart_form.MAX_URLENCODED_BYTES
+    with pytest.raises(ValueError, match="too large"):
+        parse(body, tmp_path, content_type="application/x-www-form-urlencoded")
+
+
+def test_unsupported_content_type(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported Content-Type"):
+        parse(b"{}", tmp_path, content_type="application/json")